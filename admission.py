@@ -0,0 +1,76 @@
+import threading
+
+from caching import TTLCache
+from ratelimit import KeyedBuckets, TokenBucket
+
+CHAT_RATE = "chat_rate"
+GLOBAL_RATE = "global_rate"
+QUEUE_FULL = "queue_full"
+
+
+class Admission:
+    """
+    Decides up front whether a request is worth queueing, so overload is answered quickly
+    instead of piling up behind the model.
+
+    A request is admitted if fewer than `max_queue` admitted requests are still unfinished,
+    its key (chat or session) has a token in its own bucket, and the global bucket has one.
+    admit() returns None when admitted (the caller must call done() once the work is
+    finished) or (reason, retry_after_seconds) when it is shed. A rate or size of 0 disables
+    that check. Tokens are only spent once every check has passed, so a shed request costs
+    neither its key's budget nor the global one; checks and spending happen under one lock,
+    so concurrent callers cannot overshoot `max_queue`.
+    """
+
+    def __init__(self, chat_rate: float = 0.5, chat_burst: float = 5, global_rate: float = 20, global_burst: float = 40, max_queue: int = 200, notice_interval: float = 30):
+        self.chat_limits = KeyedBuckets(chat_rate, chat_burst) if chat_rate > 0 else None
+        self.global_limit = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self.max_queue = max_queue
+        self._notified = TTLCache(maxsize=10000, ttl=notice_interval)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.admitted = 0
+        self.rejected = {CHAT_RATE: 0, GLOBAL_RATE: 0, QUEUE_FULL: 0}
+
+    def admit(self, key) -> tuple[str, float] | None:
+        with self._lock:
+            if self.max_queue and self.in_flight >= self.max_queue:
+                self.rejected[QUEUE_FULL] += 1
+                return QUEUE_FULL, 1.0
+            chat = self.chat_limits.get(key) if self.chat_limits is not None else None
+            for reason, bucket in ((CHAT_RATE, chat), (GLOBAL_RATE, self.global_limit)):
+                wait = bucket.wait_time() if bucket is not None else 0.0
+                if wait:
+                    self.rejected[reason] += 1
+                    return reason, wait
+            # Every check passed; these buckets are only taken from under this lock, so the tokens are there
+            for bucket in (chat, self.global_limit):
+                if bucket is not None:
+                    bucket.try_acquire()
+            self.admitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return None
+
+    def done(self):
+        """Marks one admitted request as finished."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def should_notify(self, key) -> bool:
+        """True at most once per `notice_interval` per key, so a flood gets one "slow down" reply, not one per message."""
+        if self._notified.get(key) is not None:
+            return False
+        self._notified.set(key, True)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self.in_flight,
+                "max_queue_depth": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+            }
@@ -1,180 +1,328 @@
 # main.py (with photo OCR support)
-import os, io, asyncio, atexit, requests
-from flask import Flask, request, jsonify
+import os, io, hmac, atexit, threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
 from dotenv import load_dotenv
 from groq import Groq
-from gtts import gTTS
-from pydub import AudioSegment
-from langdetect import detect
 from google.adk.runners import Runner
 from google.genai.types import Content, Part
 from google.adk.sessions import DatabaseSessionService
+from compaction import CompactingSessionService
+from threaded_sessions import ThreadedSessionService
+from background_loop import BackgroundLoop
+from telegram_client import TelegramClient, FileTooLarge
+from media import MediaFetcher
+from caching import TTLCache
+from tts_cache import TTSCache
+from tts_pipeline import TTSPipeline
+from audio_prep import prepare_audio
+from language import LanguageResolver
+from job_queue import KeyedJobQueue, Generations
+from idempotency import UpdateLedger
+from admission import Admission, CHAT_RATE
+from metrics import Registry, Stages, CONTENT_TYPE
+from tracing import Tracer, runner_kwargs
+from polling import OffsetStore, UpdatePoller
 from instance.agent import root_agent
 
 # -------- ENV & CONFIG --------
 load_dotenv()
 BOT_TOKEN   = os.getenv('BOT_TOKEN')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+BOT_MODE    = os.getenv('BOT_MODE', 'webhook')  # 'webhook', or 'polling' for getUpdates (no public URL needed)
 GROQ_API_KEY= os.getenv('GROQ_API_KEY')
 DB_URL      = os.getenv('DB_URL')
+WEBHOOK_SECRET  = os.getenv('WEBHOOK_SECRET')  # optional, checked against X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))
+TTS_CACHE_DIR    = os.getenv('TTS_CACHE_DIR', 'tts_cache')
+TTS_CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', '256'))  # 0 disables the cache
+TTS_WORKERS      = int(os.getenv('TTS_WORKERS', '0')) or None  # default: one process per core
+VOICE_WORKERS    = int(os.getenv('VOICE_WORKERS', '8'))
+BOT_STATE_DB     = os.getenv('BOT_STATE_DB', 'bot_state.db')  # SQLite file for the bot's own bookkeeping
+MEDIA_MAX_MB     = int(os.getenv('MEDIA_MAX_MB', '20'))  # the Bot API serves files up to 20 MB
+OCR_MIN_PIXELS   = int(os.getenv('OCR_MIN_PIXELS', '480000'))  # smallest photo size sent to OCR (~800x600)
+OCR_CACHE_SIZE   = int(os.getenv('OCR_CACHE_SIZE', '2048'))
+VOICE_CHUNK_SEC  = int(os.getenv('VOICE_CHUNK_SEC', '30'))  # longer voice notes are split at pauses
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '4'))  # concurrent Whisper requests per voice note
+TTS_DEFAULT_LANG = os.getenv('TTS_DEFAULT_LANG', 'en')
+LANG_DETECT_MIN_CHARS = int(os.getenv('LANG_DETECT_MIN_CHARS', '40'))  # shorter replies keep the chat's language
+ADMISSION_CHAT_RATE   = float(os.getenv('ADMISSION_CHAT_RATE', '0.5'))  # messages/s per chat, 0 disables
+ADMISSION_CHAT_BURST  = float(os.getenv('ADMISSION_CHAT_BURST', '5'))
+ADMISSION_GLOBAL_RATE = float(os.getenv('ADMISSION_GLOBAL_RATE', '20'))  # messages/s across chats, 0 disables
+ADMISSION_GLOBAL_BURST= float(os.getenv('ADMISSION_GLOBAL_BURST', '40'))
+ADMISSION_MAX_QUEUE   = int(os.getenv('ADMISSION_MAX_QUEUE', '200'))  # updates queued or running before new ones are shed
+
+TELEGRAM_API = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')  # overridable for local stubs (bench/)
 
-BASE_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
 APP_NAME = "instance"
 
 # -------- FLASK --------
 app = Flask(__name__)
 
-# -------- GLOBAL ASYNC LOOP --------
-LOOP = asyncio.new_event_loop()
-asyncio.set_event_loop(LOOP)
-def arun(coro): return LOOP.run_until_complete(coro)
-@atexit.register
-def _shutdown_loop():
-    try:
-        pending = asyncio.all_tasks(loop=LOOP)
-        for t in pending: t.cancel()
-        LOOP.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-    finally:
-        try: LOOP.stop()
-        except Exception: pass
-        try: LOOP.close()
-        except Exception: pass
+# -------- METRICS --------
+# Latency histogram, error counter and in-flight gauge per pipeline stage (download, transcribe, ocr, agent,
+# tts, sends, ...), served with the other counters at /metrics in Prometheus' text format
+metrics = Registry()
+stage = Stages(metrics, "bot").stage
+updates_total = metrics.counter("bot_updates_total", "Telegram updates received, by outcome", ["status"])
+
+# -------- TTS WORKERS --------
+# Sentence chunks are synthesized and encoded in parallel processes, forked here before any threads start
+tts_pipeline = TTSPipeline(workers=TTS_WORKERS).start()
+atexit.register(tts_pipeline.close)
+
+# -------- ASYNC DISPATCHER --------
+# One event loop in a background thread runs every agent turn. Job workers submit to it and wait;
+# turns of the same chat are serialized by a per-chat lock, different chats run concurrently.
+dispatcher = BackgroundLoop("bot-loop")
+dispatcher.start()  # before the job queue, so its atexit stop runs after the queue has drained
 
 # -------- CLIENTS & RUNNER --------
 client = Groq(api_key=GROQ_API_KEY)
-session_service = DatabaseSessionService(db_url=DB_URL)
-runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+# Pooled keep-alive session with timeouts, retries and Telegram's send limits
+telegram = TelegramClient(BOT_TOKEN, base_url=TELEGRAM_API)
+# Cached getFile lookups and chunked downloads into spooled temp files (memory stays flat for big files)
+media = MediaFetcher(telegram, max_bytes=MEDIA_MAX_MB * 1024 * 1024)
+# OCR text by (file_unique_id, prompt): forwarded/re-sent images are read once
+ocr_cache = TTLCache(maxsize=OCR_CACHE_SIZE, ttl=24 * 3600)
+# Synthesized replies by (text, language, voice settings); repeats skip gTTS and ffmpeg
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024) if TTS_CACHE_MAX_MB > 0 else None
+TTS_SETTINGS = {"engine": "gtts", "codec": tts_pipeline.codec}
+# gTTS voice per reply: cached, seeded detection on longer text, otherwise the chat's known language
+languages = LanguageResolver(default=TTS_DEFAULT_LANG, min_chars=LANG_DETECT_MIN_CHARS)
+threading.Thread(target=languages.warm, name="langdetect-warmup", daemon=True).start()
+# update_ids already taken, so Telegram's redeliveries are dropped before any work is done
+ledger = UpdateLedger(BOT_STATE_DB)
+# Sheds messages over the per-chat/global rates or beyond the queue bound, so one spammer can't starve other chats
+admission = Admission(ADMISSION_CHAT_RATE, ADMISSION_CHAT_BURST, ADMISSION_GLOBAL_RATE, ADMISSION_GLOBAL_BURST, ADMISSION_MAX_QUEUE)
+# Each turn loads only the newest events plus a stored summary of older ones (see compaction.py).
+# ADK's database calls block, so they run on session I/O threads and never stall the dispatcher loop.
+session_service = CompactingSessionService.from_env(ThreadedSessionService(DatabaseSessionService(db_url=DB_URL)))
+# TRACE_FILE=<path> records each turn's model calls, tool calls and session I/O as OTLP/JSON spans
+tracer = Tracer.from_env("telegram-bot")
+runner = Runner(agent=root_agent, app_name=APP_NAME, **runner_kwargs(tracer, session_service))
 
 # -------- HELPERS --------
 async def ensure_session(user_id, session_id):
-    if not await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id):
-        await session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    sessions = runner.session_service  # traced, when tracing is on
+    if not await sessions.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id):
+        await sessions.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
 
 async def agent_reply(user_id, session_id, text):
-    await ensure_session(user_id, session_id)
-    msg = Content(role="user", parts=[Part(text=text)])
-    async for ev in runner.run_async(user_id=user_id, session_id=session_id, new_message=msg):
-        if hasattr(ev, "is_final_response") and ev.is_final_response():
-            return ev.content.parts[0].text if getattr(ev, "content", None) and ev.content.parts else ""
-    return ""
+    with stage("agent"), tracer.span("telegram.turn", chat_id=user_id, session_id=session_id):
+        await ensure_session(user_id, session_id)
+        msg = Content(role="user", parts=[Part(text=text)])
+        reply = ""
+        async for ev in runner.run_async(user_id=user_id, session_id=session_id, new_message=msg):
+            if hasattr(ev, "is_final_response") and ev.is_final_response():
+                reply = ev.content.parts[0].text if getattr(ev, "content", None) and ev.content.parts else ""
+                break
+    # Off the reply path: runs once this turn releases the chat's key, before the chat's next turn
+    dispatcher.submit(compact_session(user_id, session_id), key=user_id)
+    return reply
+
+async def compact_session(user_id, session_id):
+    if not isinstance(session_service, CompactingSessionService): return
+    try:
+        with stage("compaction"):
+            session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            if session: await session_service.compact(session)
+    except Exception as e:
+        print("Compaction error:", e)
 
+@stage("send_message")
 def telegram_send(chat_id, text):
-    requests.post(f"{BASE_URL}/sendMessage", json={"chat_id": chat_id, "text": text})
+    telegram.send_message(chat_id, text)
 
+@stage("send_voice")
 def telegram_send_voice(chat_id, audio_fp):
-    requests.post(
-        f"{BASE_URL}/sendVoice",
-        data={"chat_id": chat_id},
-        files={"voice": ("reply.ogg", audio_fp, "audio/ogg")}
-    )
-
-def tts_ogg(text):
+    telegram.send_voice(chat_id, audio_fp)
+
+@stage("tts")
+def synthesize_voice(text, cancelled=None, chat_id=None):
+    lang = languages.resolve(text, chat_id)
+    if tts_cache:
+        cached = tts_cache.get(text, lang, **TTS_SETTINGS)
+        if cached is not None: return io.BytesIO(cached)
+    data = tts_pipeline.synthesize(text, lang, cancelled=cancelled)
+    if data is None: return None
+    if tts_cache: tts_cache.put(text, lang, data, **TTS_SETTINGS)
+    return io.BytesIO(data)
+
+def tts_ogg(text, cancelled=None, chat_id=None):
+    # Failures are counted by the tts stage; the reply then goes out as text only
     try:
-        lang = detect(text or "")
-        buf = io.BytesIO()
-        gTTS(text=text, lang=lang).write_to_fp(buf)
-        buf.seek(0)
-        ogg = io.BytesIO()
-        AudioSegment.from_file(buf, format="mp3").export(ogg, format="ogg", codec="libopus")
-        ogg.seek(0)
-        return ogg
-    except Exception:
+        return synthesize_voice(text, cancelled=cancelled, chat_id=chat_id)
+    except Exception as e:
+        print("TTS error:", e)
         return None
 
+# -------- VOICE STAGE --------
+# Voice replies are synthesized off the update's critical path. A newer message from the same chat
+# bumps its generation, which cancels any older voice reply still being synthesized or not yet sent.
+voice_pool = ThreadPoolExecutor(max_workers=VOICE_WORKERS, thread_name_prefix="voice")
+chat_generations = Generations()
+atexit.register(voice_pool.shutdown, cancel_futures=True)  # registered before the job queue, so it runs after it drains
+
+def voice_stage(chat_id, text, generation, text_sent):
+    stale = lambda: chat_generations.is_stale(chat_id, generation)
+    if stale(): return
+    ogg = tts_ogg(text, cancelled=stale, chat_id=chat_id)
+    # Keep the voice note after its text message, but don't hold it forever if that send hangs
+    text_sent.wait(timeout=60)
+    if ogg and not stale(): telegram_send_voice(chat_id, ogg)
+
+def send_reply(chat_id, reply, generation):
+    """Sends the text reply while its voice version is synthesized in the background."""
+    text_sent = threading.Event()
+    if reply:
+        voice_pool.submit(voice_stage, chat_id, reply, generation, text_sent)
+    try:
+        telegram_send(chat_id, reply or "…")
+    finally:
+        text_sent.set()
+
+# -------- TRANSCRIPTION --------
+# Voice notes are trimmed, downmixed to 16 kHz mono and cut at pauses (see audio_prep.py); the chunks
+# are transcribed in parallel and joined in order, so long notes cost about as much as their longest chunk.
+transcribe_pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="transcribe")
+atexit.register(transcribe_pool.shutdown, cancel_futures=True)
+
+@stage("whisper")
+def whisper(name, content):
+    r = client.audio.transcriptions.create(
+        file=(name, content),
+        model="whisper-large-v3",
+        response_format="verbose_json",
+    )
+    return (r.text or "").strip()
+
+@stage("transcribe")
 def transcribe_ogg(name, content):
     try:
-        r = client.audio.transcriptions.create(
-            file=(name, content),
-            model="whisper-large-v3",
-            response_format="verbose_json",
-        )
-        return r.text
+        try:
+            with stage("audio_prep"):
+                chunks = prepare_audio(content, max_chunk_ms=VOICE_CHUNK_SEC * 1000)
+        except Exception as e:
+            # Undecodable here (or no ffmpeg): let Whisper have the original file
+            print(f"Audio preprocessing failed, uploading as-is: {e}")
+            if hasattr(content, "seek"): content.seek(0)
+            return whisper(name, content)
+        if not chunks:
+            return ""  # nothing above the noise floor
+        if len(chunks) == 1:
+            return whisper(name, chunks[0])
+        texts = transcribe_pool.map(lambda i: whisper(f"part{i}.ogg", chunks[i]), range(len(chunks)))
+        return " ".join(t for t in texts if t)
     except Exception as e:
         return f"Transcription error: {e}"
 
+@stage("ocr")
 def ocr_image_with_groq(image_url: str, prompt: str = "Extract all visible text. Return plain text."):
-    """Use Groq multimodal chat completion to OCR a Telegram file URL."""
+    """Use Groq multimodal chat completion to OCR a Telegram file URL. Raises on API errors."""
+    completion = client.chat.completions.create(
+        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        }],
+        temperature=0.2,
+        top_p=1,
+        max_completion_tokens=1024,
+        stream=False,
+    )
+    return (completion.choices[0].message.content or "").strip()
+
+def pick_photo_size(sizes, min_pixels=OCR_MIN_PIXELS):
+    """Smallest PhotoSize with at least `min_pixels` pixels, or the largest one if none is that big."""
+    sizes = sorted(sizes, key=lambda p: p.get("width", 0) * p.get("height", 0))
+    return next((p for p in sizes if p.get("width", 0) * p.get("height", 0) >= min_pixels), sizes[-1])
+
+def read_image(file, prompt):
+    """OCR for a Telegram PhotoSize/Document, cached by (file_unique_id, prompt). Returns None if the file can't be fetched."""
+    key = (file.get("file_unique_id") or file["file_id"], prompt)
+    cached = ocr_cache.get(key)
+    if cached is not None: return cached
+    try:
+        with stage("get_file"):
+            download_url = media.url(file["file_id"], file.get("file_size"))
+    except FileTooLarge:
+        download_url = None
+    if not download_url: return None
     try:
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": image_url}},
-                ],
-            }],
-            temperature=0.2,
-            top_p=1,
-            max_completion_tokens=1024,
-            stream=False,
-        )
-        return (completion.choices[0].message.content or "").strip()
+        text = ocr_image_with_groq(download_url, prompt=prompt)
     except Exception as e:
         return f"Sorry, I couldn't read the image. ({e})"
+    ocr_cache.set(key, text)
+    return text
 
 def set_webhook():
-    return requests.post(f"{BASE_URL}/setWebhook", json={"url": WEBHOOK_URL}).json()
-
-# -------- ROUTES --------
-@app.route('/webhook/', methods=['POST'])
-def webhook():
-    u = request.json or {}
-    if "message" not in u:
-        return jsonify({"status": "ignored"})
+    return telegram.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+
+# -------- UPDATE HANDLING --------
+def handle_update(u, generation=None):
+    """
+    Processes one Telegram update end to end (agent, OCR/STT, replies). Runs on a job worker.
+    `generation` is the chat's generation when the update arrived; its voice reply is dropped once a newer one arrives.
+    """
     m = u["message"]
     # print(m)
 
     chat = m.get("chat", {})
     chat_id = str(chat.get("id"))
+    if generation is None: generation = chat_generations.bump(chat_id)
     session_id = f"s_{chat_id}"
+    languages.hint(chat_id, (m.get("from") or {}).get("language_code"))  # voice for short replies until one is detected
 
     # TEXT
     if "text" in m:
         text = m["text"]
         if text.startswith("/start"):
             text = f"Hello {chat.get('first_name','')} {chat.get('last_name','')}".strip()
-        reply = arun(agent_reply(chat_id, session_id, text))
-        telegram_send(chat_id, reply or "…")
-        if reply:
-            ogg = tts_ogg(reply)
-            if ogg: telegram_send_voice(chat_id, ogg)
-        return jsonify({"status": "ok"})
+        reply = dispatcher.run(agent_reply(chat_id, session_id, text), key=chat_id)
+        send_reply(chat_id, reply, generation)
+        return
 
     # VOICE
     if "voice" in m:
         file_id = m["voice"]["file_id"]
-        f = requests.get(f"{BASE_URL}/getFile?file_id={file_id}").json()
-        if not f.get("ok"):
+        file_size = m["voice"].get("file_size")
+        try:
+            # getFile first, timed on its own; fetch() then reuses the cached file path
+            with stage("get_file"):
+                path = media.file_path(file_id, file_size)
+            with stage("download"):
+                audio = media.fetch(file_id, file_size) if path else None
+        except FileTooLarge:
+            telegram_send(chat_id, f"That voice note is too long for me, please keep it under {MEDIA_MAX_MB} MB.")
+            return
+        except Exception:
+            audio = None
+        if audio is None:
             telegram_send(chat_id, "Couldn't fetch voice note.")
-            return jsonify({"status": "ok"})
-        url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{f['result']['file_path']}"
-        audio_bytes = requests.get(url).content
-        text = transcribe_ogg("voice.ogg", audio_bytes)
-        reply = arun(agent_reply(chat_id, session_id, text))
-        telegram_send(chat_id, reply or "…")
-        if reply:
-            ogg = tts_ogg(reply)
-            if ogg: telegram_send_voice(chat_id, ogg)
-        return jsonify({"status": "ok"})
+            return
+        with audio:
+            text = transcribe_ogg("voice.ogg", audio)
+        if not text:
+            telegram_send(chat_id, "I couldn't hear anything in that voice note.")
+            return
+        reply = dispatcher.run(agent_reply(chat_id, session_id, text), key=chat_id)
+        send_reply(chat_id, reply, generation)
+        return
 
     # PHOTO (images sent as photos)
     if "photo" in m:
-        file_id = m["photo"][-1]["file_id"]  # highest-res
-        f = requests.get(f"{BASE_URL}/getFile?file_id={file_id}").json()
-        if not f.get("ok"):
-            telegram_send(chat_id, "Sorry, could not retrieve the photo.")
-            return jsonify({"status": "ok"})
-        file_path = f["result"]["file_path"]
-        download_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-
         # read optional user caption
         caption = (m.get("caption") or "").strip()
 
-        extracted = ocr_image_with_groq(
-            download_url,
-            prompt="Extract all text in reading order. If none, say 'No text found.'"
-        )
+        # smallest resolution that is still legible, not always the largest
+        extracted = read_image(pick_photo_size(m["photo"]), "Extract all text in reading order. If none, say 'No text found.'")
+        if extracted is None:
+            telegram_send(chat_id, "Sorry, could not retrieve the photo.")
+            return
 
         # show both to the user
         preview = "🖼️ I read this from your image:\n\n"
@@ -187,12 +335,9 @@ def webhook():
         combined = (caption + "\n\n[OCR]\n" + extracted).strip() if caption else extracted
         print(combined)
 
-        reply = arun(agent_reply(chat_id, session_id, combined))
-        telegram_send(chat_id, reply or "…")
-        if reply:
-            ogg = tts_ogg(reply)
-            if ogg: telegram_send_voice(chat_id, ogg)
-        return jsonify({"status": "ok"})
+        reply = dispatcher.run(agent_reply(chat_id, session_id, combined), key=chat_id)
+        send_reply(chat_id, reply, generation)
+        return
 
     # STICKER
     if "sticker" in m:
@@ -207,31 +352,18 @@ def webhook():
             sticker_message = f"{emoji}"
 
         # Get reply from the agent based on the sticker emoji
-        reply = arun(agent_reply(chat_id, session_id, sticker_message))
+        reply = dispatcher.run(agent_reply(chat_id, session_id, sticker_message), key=chat_id)
 
         telegram_send(chat_id, reply or "…")
-        return jsonify({"status": "ok"})
-
-    # FALLBACK
-    telegram_send(chat_id, "Unsupported message type.")
-    return jsonify({"status": "ok"})
+        return
 
     # DOCUMENT image (treat image documents like photos)
     if "document" in m and "image" in (m["document"].get("mime_type") or ""):
-        file_id = m["document"]["file_id"]
-        f = requests.get(f"{BASE_URL}/getFile?file_id={file_id}").json()
-        if not f.get("ok"):
-            telegram_send(chat_id, "Sorry, could not retrieve the image document.")
-            return jsonify({"status": "ok"})
-        file_path = f["result"]["file_path"]
-        download_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-
         caption = (m.get("caption") or "").strip()
-
-        extracted = ocr_image_with_groq(
-            download_url,
-            prompt="Extract all text in reading order. If none, say 'No text found.'"
-        )
+        extracted = read_image(m["document"], "Extract all text in reading order. If none, say 'No text found.'")
+        if extracted is None:
+            telegram_send(chat_id, "Sorry, could not retrieve the image document.")
+            return
 
         preview = "🖼️ I read this from your image document:\n\n"
         if caption:
@@ -240,21 +372,103 @@ def webhook():
         telegram_send(chat_id, preview)
 
         combined = (extracted + "\n\n" + caption).strip() if caption else extracted
-        reply = arun(agent_reply(chat_id, session_id, combined))
-        telegram_send(chat_id, reply or "…")
-        if reply:
-            ogg = tts_ogg(reply)
-            if ogg: telegram_send_voice(chat_id, ogg)
-        return jsonify({"status": "ok"})
+        reply = dispatcher.run(agent_reply(chat_id, session_id, combined), key=chat_id)
+        send_reply(chat_id, reply, generation)
+        return
 
     # FALLBACK
     telegram_send(chat_id, "Unsupported message type.")
-    return jsonify({"status": "ok"})
+
+@stage("update")
+def process_update(u, generation):
+    """Job entry point: handles the update, then marks it done (or frees it for a retry if it failed)."""
+    update_id = u.get("update_id")
+    try:
+        handle_update(u, generation)
+    except Exception:
+        if update_id is not None: ledger.release(update_id)
+        raise
+    finally:
+        admission.done()
+    if update_id is not None: ledger.complete(update_id)
+
+# Updates are processed in the background: FIFO per chat, different chats in parallel
+jobs = KeyedJobQueue(process_update, workers=WEBHOOK_WORKERS, name="webhook")
+atexit.register(jobs.close)
+# "Slow down" replies to shed messages, sent off the webhook's path (at most one per chat per 30 s)
+notice_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="notice")
+atexit.register(notice_pool.shutdown)
+
+def enqueue_update(u):
+    """Drops duplicate and unsupported updates, sheds them over admission limits, queues the rest for their chat. Returns a status string."""
+    if "message" not in u:
+        updates_total.inc(status="ignored")
+        return "ignored"
+    update_id = u.get("update_id")
+    if update_id is not None and not ledger.claim(update_id):
+        updates_total.inc(status="duplicate")
+        return "duplicate"
+    chat_id = str(u["message"].get("chat", {}).get("id"))
+    rejected = admission.admit(chat_id)
+    if rejected:
+        if update_id is not None: ledger.complete(update_id)  # shed for good: a redelivery would be shed again
+        if admission.should_notify(chat_id):
+            if rejected[0] == CHAT_RATE:
+                notice = "You're sending messages faster than I can answer. Give me a moment, then send that again."
+            else:
+                notice = "I'm getting a lot of messages right now. Please try again in a minute."
+            notice_pool.submit(telegram_send, chat_id, notice)
+        updates_total.inc(status="shed")
+        return "shed"
+    generation = chat_generations.bump(chat_id)  # supersedes voice replies still pending for this chat
+    try:
+        jobs.submit(chat_id, u, generation)
+    except Exception:
+        # Never queued, so process_update won't free the slot or settle the claim
+        admission.done()
+        if update_id is not None: ledger.release(update_id)
+        raise
+    updates_total.inc(status="queued")
+    return "queued"
+
+# -------- ROUTES --------
+@app.route('/webhook/', methods=['POST'])
+def webhook():
+    # Acknowledge right away so Telegram does not time out and redeliver the update
+    if WEBHOOK_SECRET and not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), WEBHOOK_SECRET):
+        return jsonify({"status": "forbidden"}), 403
+    return jsonify({"status": enqueue_update(request.get_json(silent=True) or {})})
+
+@app.route('/stats')
+def stats():
+    return jsonify({"tts_cache": tts_cache.stats() if tts_cache else None, "media": media.stats(), "ocr_cache": ocr_cache.stats(), "languages": languages.stats(), "admission": admission.stats()})
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+# Existing stats() counters, read at scrape time
+metrics.collect("bot_jobs", lambda: {"pending": jobs.pending()})
+metrics.collect("bot_admission", admission.stats)
+metrics.collect("bot_media", media.stats)
+metrics.collect("bot_ocr_cache", ocr_cache.stats)
+metrics.collect("bot_languages", languages.stats)
+if tts_cache: metrics.collect("bot_tts_cache", tts_cache.stats)
 
 @app.route('/')
 def webhook_route():
+    if BOT_MODE == 'polling':
+        return jsonify({"ok": False, "description": "Running in polling mode; a webhook would stop getUpdates."}), 409
     return jsonify(set_webhook())
 
+# -------- LONG POLLING --------
+def start_polling():
+    """Receives updates via getUpdates in batches; they go through the same dedup, queue and handlers as webhooks."""
+    poller = UpdatePoller(telegram, enqueue_update, OffsetStore(BOT_STATE_DB), bot_id=(BOT_TOKEN or "").split(":")[0])
+    atexit.register(poller.stop, 5)  # runs before the job queue drains
+    return poller.start()
+
 # -------- MAIN --------
 if __name__ == '__main__':
+    if BOT_MODE == 'polling': start_polling()
     app.run(debug=True, use_reloader=False)
@@ -0,0 +1,86 @@
+import io
+import logging
+
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000  # what Whisper resamples to anyway; anything above is wasted upload
+
+
+def decode(source, format: str = "ogg", sample_rate: int = SAMPLE_RATE) -> AudioSegment:
+    """Decodes a file or bytes into mono audio at `sample_rate` (ffmpeg downmixes and resamples while decoding)."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    audio = AudioSegment.from_file(source, format=format, parameters=["-ac", "1", "-ar", str(sample_rate)])
+    return audio.set_channels(1).set_frame_rate(sample_rate)
+
+
+def speech_ranges(audio: AudioSegment, min_silence_ms: int = 400, threshold_db: float = 16, keep_silence_ms: int = 200) -> list[tuple[int, int]]:
+    """
+    Energy-based VAD: (start_ms, end_ms) of the parts louder than `threshold_db` below the clip's
+    average level, separated by at least `min_silence_ms` of quiet. Ranges are padded by
+    `keep_silence_ms` so word edges are not clipped, and padded ranges that touch are merged.
+    """
+    if audio.dBFS == float("-inf"):
+        return []
+    ranges = detect_nonsilent(audio, min_silence_len=min_silence_ms, silence_thresh=audio.dBFS - threshold_db, seek_step=10)
+    merged = []
+    for start, end in ranges:
+        start, end = max(0, start - keep_silence_ms), min(len(audio), end + keep_silence_ms)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def plan_chunks(ranges: list[tuple[int, int]], max_chunk_ms: int) -> list[list[tuple[int, int]]]:
+    """
+    Groups speech ranges into chunks of at most `max_chunk_ms` of speech, so every cut falls in
+    a pause. A single range longer than that (no pause to cut at) is split hard.
+    """
+    chunks = []
+    current, length = [], 0
+    for start, end in ranges:
+        while end - start > max_chunk_ms:
+            if current:
+                chunks.append(current)
+                current, length = [], 0
+            chunks.append([(start, start + max_chunk_ms)])
+            start += max_chunk_ms
+        if current and length + (end - start) > max_chunk_ms:
+            chunks.append(current)
+            current, length = [], 0
+        current.append((start, end))
+        length += end - start
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def encode(audio: AudioSegment, format: str = "ogg", codec: str | None = "libopus", bitrate: str = "24k") -> bytes:
+    """Encodes a chunk for upload; 24 kbit/s Opus is plenty for speech at 16 kHz."""
+    out = io.BytesIO()
+    audio.export(out, format=format, codec=codec, bitrate=bitrate)
+    return out.getvalue()
+
+
+def prepare_audio(source, format: str = "ogg", max_chunk_ms: int = 30000, sample_rate: int = SAMPLE_RATE, **vad) -> list[bytes]:
+    """
+    Turns a voice note into upload-ready chunks: decoded to 16 kHz mono, leading/trailing
+    silence and long pauses dropped, and cut at pauses into pieces of at most `max_chunk_ms`
+    that can be transcribed concurrently. Returns [] if nothing louder than the noise floor
+    was found. Raises if the audio cannot be decoded.
+    """
+    audio = decode(source, format, sample_rate)
+    ranges = speech_ranges(audio, **vad)
+    chunks = []
+    for chunk in plan_chunks(ranges, max_chunk_ms):
+        segment = audio[chunk[0][0]:chunk[0][1]]
+        for start, end in chunk[1:]:
+            segment += audio[start:end]
+        chunks.append(encode(segment))
+    logger.debug(f"Voice note: {len(audio)} ms decoded, {sum(e - s for s, e in ranges)} ms of speech in {len(chunks)} chunk(s)")
+    return chunks
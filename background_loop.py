@@ -0,0 +1,142 @@
+import asyncio
+import atexit
+import queue
+import threading
+from contextlib import asynccontextmanager
+
+
+class KeyedLocks:
+    """
+    asyncio locks by key (e.g. chat id), created on first use and dropped once nobody holds
+    or waits for them. Waiters acquire in arrival order. Use only from the loop's own thread.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [asyncio.Lock, holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class BackgroundLoop:
+    """
+    One asyncio event loop running forever in a daemon thread.
+
+    Sync code (e.g. Flask request threads) hands coroutines to this loop instead of
+    calling asyncio.run(), so the ADK Runner, the session service and their async
+    clients live on a single loop for the whole process and can serve many chats
+    concurrently. Anything that blocks must stay off this loop (see
+    threaded_sessions.ThreadedSessionService for ADK's database session service).
+
+    Passing a `key` to submit/run/iterate serializes coroutines that share it (one chat's
+    turns stay in order) while different keys keep running in parallel.
+    """
+
+    def __init__(self, name: str = "adk-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.key_locks = KeyedLocks()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started lazily on first use."""
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Starts the loop thread if it is not already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+        atexit.register(self.stop)
+
+    def _run(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    async def _keyed(self, key, coro):
+        async with self.key_locks.hold(key):
+            return await coro
+
+    def submit(self, coro, key=None):
+        """Schedules a coroutine on the loop (after earlier ones with the same key) and returns a concurrent.futures.Future."""
+        if key is not None:
+            coro = self._keyed(key, coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None, key=None):
+        """Runs a coroutine on the loop and blocks the calling thread until it finishes."""
+        return self.submit(coro, key=key).result(timeout)
+
+    def iterate(self, agen, key=None):
+        """
+        Consumes an async generator on the loop and yields its items to sync code as they arrive.
+        Closing the returned generator early cancels the async one.
+        """
+        items = queue.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+            except Exception as e:
+                items.put((finished, e))
+            else:
+                items.put((finished, None))
+            finally:
+                await agen.aclose()
+
+        future = self.submit(pump(), key=key)
+        try:
+            while True:
+                item, error = items.get()
+                if item is finished:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def stop(self):
+        """Cancels pending tasks, stops the loop and waits for the thread to exit."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or thread is None or not thread.is_alive():
+                return
+
+            async def cancel_pending():
+                pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            try:
+                asyncio.run_coroutine_threadsafe(cancel_pending(), loop).result(timeout=5)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            if not thread.is_alive():
+                loop.close()
@@ -0,0 +1 @@
+"""Offline benchmarks for index.py and app.py: stub model, stub Telegram/Groq APIs, concurrent load. Run with `python -m bench`."""
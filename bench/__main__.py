@@ -0,0 +1,245 @@
+"""
+Offline load test for index.py and app.py.
+
+    python -m bench                       # both apps, default load
+    python -m bench index --requests 500 --concurrency 32 --llm-latency 0.5
+    python -m bench app --json results.json
+    python -m bench --baseline results.json --tolerance 0.2   # exit 1 on regression
+
+Each app is served by a real threaded Werkzeug server on localhost. The agent is replaced by a
+stub LLM with fixed latency, Telegram and Groq are served by a local stub API, and all
+databases live in a temporary directory, so no API keys or network access are needed.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench.measure import LockWaitMonitor, run_load  # noqa: E402
+from bench.stubs import StubApiServer, make_stub_agent, stub_summarizer, telegram_update  # noqa: E402
+
+
+def serve(flask_app):
+    """Starts a threaded server for `flask_app` on a free port and returns (server, base_url)."""
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def stub_runtime(module, args):
+    """Swaps the module's Runner for one driving the stub agent, keeping its session service."""
+    from google.adk.runners import Runner
+    from tracing import runner_kwargs
+
+    module.runner = Runner(
+        agent=make_stub_agent(args.llm_latency, args.token_latency),
+        app_name=module.APP_NAME,
+        # Same tracing setup as the app (on when TRACE_FILE is set)
+        **runner_kwargs(module.tracer, module.session_service),
+    )
+    compactor = getattr(module, "compactor", module.session_service)
+    if hasattr(compactor, "summarizer"):
+        compactor.summarizer = stub_summarizer
+
+
+def bench_index(args, monitor: LockWaitMonitor) -> dict:
+    import index
+
+    stub_runtime(index, args)
+    index.init_db()
+    server, url = serve(index.app)
+    http = requests.Session()
+    http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    prefix = f"bench-{os.getpid()}"
+
+    def chat(i):
+        r = http.post(f"{url}/chat", params={"session_id": f"{prefix}-{i % args.sessions}"}, json={"message": f"message {i}"})
+        return r.status_code == 200
+
+    def chat_stream(i):
+        r = http.post(f"{url}/chat/stream", params={"session_id": f"{prefix}-{i % args.sessions}"}, json={"message": f"message {i}"})
+        return r.status_code == 200 and "event: done" in r.text
+
+    def history(i):
+        r = http.get(f"{url}/history", params={"session_id": f"{prefix}-{i % args.sessions}"})
+        return r.status_code == 200
+
+    results = {}
+    try:
+        for name, call in (("index /chat", chat), ("index /chat/stream", chat_stream), ("index /history", history)):
+            run_load(call, min(args.warmup, args.requests), args.concurrency)
+            monitor.reset()
+            results[name] = {**run_load(call, args.requests, args.concurrency), **monitor.stats()}
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_app(args, monitor: LockWaitMonitor, api: StubApiServer) -> dict:
+    import app as bot
+
+    stub_runtime(bot, args)
+
+    def tts_ogg(text, cancelled=None, chat_id=None):
+        # gTTS has no local endpoint to point at; stand in with its typical cost
+        time.sleep(args.tts_latency)
+        return io.BytesIO(b"OggS" + b"\0" * 1020)
+
+    bot.tts_ogg = tts_ogg
+    server, url = serve(bot.app)
+    http = requests.Session()
+    http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    counter = iter(range(1, 10**9))
+    counter_lock = threading.Lock()
+
+    def webhook(kind):
+        def call(i):
+            with counter_lock:
+                update_id = next(counter)
+            r = http.post(f"{url}/webhook/", json=telegram_update(update_id, 1000 + i % args.sessions, kind))
+            return r.status_code == 200
+        return call
+
+    results = {}
+    try:
+        for kind in ("text", "voice", "photo"):
+            call = webhook(kind)
+            run_load(call, min(args.warmup, args.requests), args.concurrency)
+            bot.jobs.join()
+            monitor.reset()
+            started = time.perf_counter()
+            result = run_load(call, args.requests, args.concurrency)
+            # The webhook only acknowledges; text replies are all sent once the job queue drains
+            # (voice notes follow in the background)
+            bot.jobs.join()
+            result["processed_rps"] = round(args.requests / (time.perf_counter() - started), 2)
+            results[f"app /webhook {kind}"] = {**result, **monitor.stats()}
+        # Long polling: the same updates arrive in getUpdates batches instead of one request each
+        with counter_lock:
+            first = next(counter)
+            for update_id in range(first, first + args.requests):
+                api.updates.append(telegram_update(update_id, 1000 + update_id % args.sessions, "text"))
+            for _ in range(args.requests - 1):
+                next(counter)
+        monitor.reset()
+        started = time.perf_counter()
+        poller = bot.start_polling()
+        while (poller.offsets.get(poller.bot_id) or 0) < first + args.requests:
+            time.sleep(0.01)
+        fetched = time.perf_counter() - started
+        bot.jobs.join()
+        seconds = time.perf_counter() - started
+        poller.stop()
+        results["app getUpdates text"] = {
+            "requests": args.requests, "concurrency": 1, "errors": 0, "first_error": None,
+            "seconds": round(seconds, 3), "rps": round(args.requests / fetched, 2),
+            "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0,
+            "processed_rps": round(args.requests / seconds, 2), **monitor.stats(),
+        }
+    finally:
+        server.shutdown()
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compares against a previous --json file; returns a description per regressed metric."""
+    problems = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: {current['rps']} req/s < baseline {base['rps']} req/s")
+        if current["errors"] > base["errors"]:
+            problems.append(f"{name}: {current['errors']} errors > baseline {base['errors']}")
+    return problems
+
+
+def print_table(results: dict):
+    columns = ("rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "errors", "db_lock_waits", "db_lock_wait_ms")
+    width = max(len(name) for name in results) + 2
+    print("".join([f"{'scenario':<{width}}"] + [f"{c:>16}" for c in columns]))
+    for name, row in results.items():
+        print("".join([f"{name:<{width}}"] + [f"{row[c]:>16}" for c in columns]))
+        if "processed_rps" in row:
+            print(f"  processed: {row['processed_rps']} updates/s")
+        if row["first_error"]:
+            print(f"  first error: {row['first_error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("target", nargs="?", choices=("index", "app", "all"), default="all")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--sessions", type=int, default=32, help="distinct chats/sessions the load is spread over")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub model latency per call (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="delay between streamed tokens (s)")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="stub Telegram/Groq latency per call (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="stand-in text-to-speech cost (s)")
+    parser.add_argument("--workers", type=int, default=8, help="app.py webhook job workers (WEBHOOK_WORKERS)")
+    parser.add_argument("--lock-threshold", type=float, default=0.005, help="write duration counted as a lock wait (s)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs. baseline")
+    args = parser.parse_args(argv)
+
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="adk-bench-")
+    api = StubApiServer(latency=args.api_latency).start()
+    os.environ.update({
+        "BOT_TOKEN": "bench",
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": api.url,
+        "TELEGRAM_API_URL": api.url,
+        "DB_URL": f"sqlite:///{os.path.join(workdir, 'bot_sessions.db')}",
+        "WEBHOOK_WORKERS": str(args.workers),
+        # Throughput is measured without shedding; admission limits would reject most of the load
+        "ADMISSION_CHAT_RATE": "0",
+        "ADMISSION_GLOBAL_RATE": "0",
+        "ADMISSION_MAX_QUEUE": "0",
+    })
+    # index.py keeps history.db (and its ADK sessions) in the working directory
+    os.chdir(workdir)
+    monitor = LockWaitMonitor(args.lock_threshold).install()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    results = {}
+    if args.target in ("index", "all"):
+        results.update(bench_index(args, monitor))
+    if args.target in ("app", "all"):
+        results.update(bench_app(args, monitor, api))
+    monitor.uninstall()
+    api.stop()
+
+    print_table(results)
+    print(f"stub API calls: {api.calls}")
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(os.path.join(invocation_dir, args.baseline)) as f:
+            problems = regressions(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
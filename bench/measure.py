@@ -0,0 +1,155 @@
+"""Load generation, latency percentiles and SQLite lock-wait accounting."""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "BEGIN")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def run_load(call, total: int, concurrency: int) -> dict:
+    """
+    Runs `call(i)` for i in range(total) from `concurrency` threads.
+    `call` returns True on success. Returns request counts, throughput and latency percentiles (ms).
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception as e:
+            ok, error = False, repr(e)
+        else:
+            error = None if ok else "unexpected response"
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if error:
+                errors.append(error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(wall, 3),
+        "rps": round(total / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+class LockWaitMonitor:
+    """
+    Measures time SQLite write statements spend blocked on the database lock.
+
+    While installed, every sqlite3 connection (the apps' own and SQLAlchemy's for ADK) is
+    created with a timing connection class. A write statement or commit that takes longer
+    than `threshold` seconds is counted as a lock wait; uncontended writes on a local file
+    finish well below it, so the count and total show busy-timeout waiting under load.
+    "database is locked" errors are counted separately.
+    """
+
+    def __init__(self, threshold: float = 0.005):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._original_connect = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.waits = 0
+            self.wait_seconds = 0.0
+            self.max_wait = 0.0
+            self.locked_errors = 0
+
+    def _record(self, elapsed: float):
+        if elapsed < self.threshold:
+            return
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def _timed(self, fn, sql, *args):
+        if not isinstance(sql, str) or not sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            return fn(sql, *args)
+        start = time.perf_counter()
+        try:
+            return fn(sql, *args)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                with self._lock:
+                    self.locked_errors += 1
+            raise
+        finally:
+            self._record(time.perf_counter() - start)
+
+    def install(self) -> "LockWaitMonitor":
+        monitor = self
+
+        class TimedCursor(sqlite3.Cursor):
+            def execute(self, sql, *args):
+                return monitor._timed(super().execute, sql, *args)
+
+            def executemany(self, sql, *args):
+                return monitor._timed(super().executemany, sql, *args)
+
+        class TimedConnection(sqlite3.Connection):
+            def cursor(self, factory=TimedCursor):
+                return super().cursor(factory)
+
+            def execute(self, sql, *args):
+                return self.cursor().execute(sql, *args)
+
+            def executemany(self, sql, *args):
+                return self.cursor().executemany(sql, *args)
+
+            def commit(self):
+                start = time.perf_counter()
+                try:
+                    return super().commit()
+                finally:
+                    monitor._record(time.perf_counter() - start)
+
+        original = self._original_connect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            kwargs.setdefault("factory", TimedConnection)
+            return original(*args, **kwargs)
+
+        sqlite3.connect = connect
+        return self
+
+    def uninstall(self):
+        if self._original_connect is not None:
+            sqlite3.connect = self._original_connect
+            self._original_connect = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "db_lock_waits": self.waits,
+                "db_lock_wait_ms": round(self.wait_seconds * 1000, 2),
+                "db_lock_wait_max_ms": round(self.max_wait * 1000, 2),
+                "db_locked_errors": self.locked_errors,
+            }
@@ -0,0 +1,160 @@
+"""Deterministic stand-ins for the model and the external HTTP APIs used by the apps."""
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai.types import Content, Part
+
+REPLY_WORDS = ["Sure", ",", " here", " is", " a", " benchmark", " reply", "."]
+
+
+class StubLlm(BaseLlm):
+    """Replies with the same sentence after `latency` seconds; streams it word by word when asked to."""
+
+    latency: float = 0.2
+    token_latency: float = 0.0
+
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        if stream:
+            for word in REPLY_WORDS:
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                yield LlmResponse(content=Content(role="model", parts=[Part(text=word)]), partial=True)
+        yield LlmResponse(content=Content(role="model", parts=[Part(text="".join(REPLY_WORDS))]))
+
+
+def make_stub_agent(latency: float = 0.2, token_latency: float = 0.0, name: str = "bench_agent") -> Agent:
+    return Agent(
+        name=name,
+        model=StubLlm(model="stub", latency=latency, token_latency=token_latency),
+        instruction="Benchmark agent.",
+    )
+
+
+async def stub_summarizer(previous: str, events: list) -> str:
+    """Compaction summarizer that skips the model call."""
+    return f"{previous} [{len(events)} earlier events]".strip()
+
+
+class StubApiServer:
+    """
+    Local HTTP server answering the Telegram Bot API and Groq endpoints app.py calls.
+
+    Point app.py at it with TELEGRAM_API_URL=<url> and GROQ_BASE_URL=<url>. Every call
+    sleeps `latency` seconds and is counted per endpoint in `calls`. Updates appended to
+    `updates` are served by getUpdates (honouring offset and limit).
+    """
+
+    def __init__(self, latency: float = 0.02, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.calls = {}
+        self.updates = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubApiServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body, content_type="application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                time.sleep(stub.latency)
+                path = self.path.split("?")[0]
+
+                if path.startswith("/file/bot"):
+                    stub._count("file")
+                    return self._reply(b"OggS" + b"\0" * 4092, "application/octet-stream")
+                match = re.match(r"/bot[^/]*/(\w+)", path)
+                if match:
+                    method = match.group(1)
+                    stub._count(method)
+                    if method == "getFile":
+                        return self._reply({"ok": True, "result": {"file_id": "f", "file_unique_id": "u", "file_size": 4096, "file_path": "voice/file_0.oga"}})
+                    if method == "getUpdates":
+                        params = json.loads(body or b"{}")
+                        offset = params.get("offset") or 0
+                        with stub._lock:
+                            batch = [u for u in stub.updates if u["update_id"] >= offset][: params.get("limit", 100)]
+                        if not batch:
+                            time.sleep(min(params.get("timeout", 0), 0.2))  # a short stand-in for the long poll
+                        return self._reply({"ok": True, "result": batch})
+                    if method in ("deleteWebhook", "setWebhook"):
+                        return self._reply({"ok": True, "result": True})
+                    return self._reply({"ok": True, "result": {"message_id": 1, "date": int(time.time()), "chat": {"id": 0}}})
+                if path.endswith("/audio/transcriptions"):
+                    stub._count("transcriptions")
+                    return self._reply({"text": "What is the weather like today?", "language": "english", "duration": 2.0, "segments": []})
+                if path.endswith("/chat/completions"):
+                    stub._count("chat.completions")
+                    return self._reply({
+                        "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+                        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Text read from the image."}}],
+                    })
+                stub._count("unknown")
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = _route
+            do_POST = _route
+
+        return Handler
+
+
+def telegram_update(update_id: int, chat_id: int, kind: str = "text") -> dict:
+    """Builds a Telegram webhook update of the given kind ('text', 'voice', 'photo' or 'sticker')."""
+    message = {"message_id": update_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private", "first_name": "Bench"}}
+    if kind == "text":
+        message["text"] = f"Benchmark message {update_id}"
+    elif kind == "voice":
+        message["voice"] = {"file_id": f"voice-{update_id}", "file_unique_id": f"v{update_id}", "duration": 2, "file_size": 4096}
+    elif kind == "photo":
+        message["photo"] = [
+            {"file_id": f"photo-{update_id}-s", "file_unique_id": f"p{update_id}s", "width": 90, "height": 90},
+            {"file_id": f"photo-{update_id}-m", "file_unique_id": f"p{update_id}m", "width": 800, "height": 800},
+        ]
+    elif kind == "sticker":
+        message["sticker"] = {"file_id": f"sticker-{update_id}", "file_unique_id": f"s{update_id}", "emoji": "👍"}
+    return {"update_id": update_id, "message": message}
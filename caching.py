@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with optional per-entry expiry and a weight budget.
+
+    Entries are evicted least-recently-used first once there are more than `maxsize`
+    of them, or once the summed `weigher(value)` exceeds `max_weight`. Entries older
+    than `ttl` seconds are treated as misses. Hit/miss/eviction counters are kept
+    for stats().
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, max_weight: int | None = None, weigher=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda value: 1)
+        self._data = OrderedDict()  # key -> (value, stored_at, weight)
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value (marking it recently used), or `default` on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Stores a value (re-weighing it if already present) and evicts entries over budget."""
+        weight = self.weigher(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic(), weight)
+            self._weight += weight
+            while self._data and (
+                len(self._data) > self.maxsize
+                or (self.max_weight is not None and self._weight > self.max_weight and len(self._data) > 1)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Removes a key and returns its value, or `default` if it was not cached."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def _remove(self, key):
+        value, _, weight = self._data.pop(key)
+        self._weight -= weight
+        return value
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Counters and current size, e.g. for a stats or metrics endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "weight": self._weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
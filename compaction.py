@@ -0,0 +1,209 @@
+import logging
+import os
+from typing import Any, Optional
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.genai.types import Content, Part
+
+logger = logging.getLogger(__name__)
+
+# Session state keys holding the running summary and the timestamp of the newest event folded into it
+SUMMARY_KEY = "compaction_summary"
+COMPACTED_UNTIL_KEY = "compaction_until"
+SUMMARY_AUTHOR = "user"
+SUMMARY_PREFIX = "[Summary of the earlier conversation]\n"
+
+SUMMARY_PROMPT = """You maintain the running summary of a chat between a user and an AI assistant.
+Merge the previous summary with the new messages into one concise summary (at most 250 words).
+Keep names, facts, numbers, decisions, user preferences and open questions; drop small talk.
+Reply with the summary text only.
+
+Previous summary:
+{previous}
+
+New messages:
+{transcript}"""
+
+
+def event_transcript(events: list[Event], max_chars: int = 500) -> str:
+    """Renders events as 'author: text' lines, including tool calls and (truncated) tool results."""
+    lines = []
+    for event in events:
+        if not event.content or not event.content.parts:
+            continue
+        for part in event.content.parts:
+            if part.text:
+                lines.append(f"{event.author}: {part.text[:max_chars]}")
+            elif part.function_call:
+                lines.append(f"{event.author} called {part.function_call.name}({part.function_call.args})")
+            elif part.function_response:
+                lines.append(f"{part.function_response.name} returned: {str(part.function_response.response)[:max_chars]}")
+    return "\n".join(lines)
+
+
+class GeminiSummarizer:
+    """Summarizes folded events with a Gemini model; falls back to a truncated transcript on errors."""
+
+    def __init__(self, model: str = "gemini-2.0-flash", max_fallback_chars: int = 4000):
+        self.model = model
+        self.max_fallback_chars = max_fallback_chars
+        self._client = None
+
+    async def __call__(self, previous: str, events: list[Event]) -> str:
+        transcript = event_transcript(events)
+        try:
+            if self._client is None:
+                from google import genai
+                self._client = genai.Client()
+            response = await self._client.aio.models.generate_content(
+                model=self.model,
+                contents=SUMMARY_PROMPT.format(previous=previous or "(none)", transcript=transcript),
+            )
+            if response.text:
+                return response.text.strip()
+        except Exception as e:
+            logger.warning(f"Compaction summary via {self.model} failed, keeping a truncated transcript: {e}")
+        # Keep the newest part of the combined text if the model is unavailable
+        return f"{previous}\n{transcript}".strip()[-self.max_fallback_chars:]
+
+
+class CompactingSessionService(BaseSessionService):
+    """
+    Wraps a session service so each turn loads a bounded window of a session's events.
+
+    get_session() only reads the newest `keep_last + threshold` events and puts a synthetic
+    summary event in front of them. That summary is kept in the session state.
+    compact() folds everything but the last `keep_last` events into the summary once a session
+    has `keep_last + threshold` events that are not in the summary yet. The new summary is
+    stored by appending an event whose state delta carries it.
+
+    Per-turn DB reads, prompt size and latency therefore stay flat however long a chat gets.
+    """
+
+    def __init__(self, inner: BaseSessionService, keep_last: int = 20, threshold: int = 20, summarizer=None):
+        self.inner = inner
+        self.keep_last = keep_last
+        self.threshold = threshold
+        self.summarizer = summarizer or GeminiSummarizer()
+        self._compacting = set()  # session ids with a compaction in flight
+
+    @classmethod
+    def from_env(cls, inner: BaseSessionService) -> BaseSessionService:
+        """
+        Builds the wrapper from COMPACTION_KEEP_LAST / COMPACTION_THRESHOLD / COMPACTION_MODEL.
+        Returns `inner` unchanged when COMPACTION_KEEP_LAST is 0 (compaction disabled).
+        """
+        keep_last = int(os.getenv("COMPACTION_KEEP_LAST", "20"))
+        if keep_last <= 0:
+            return inner
+        return cls(
+            inner,
+            keep_last=keep_last,
+            threshold=int(os.getenv("COMPACTION_THRESHOLD", "20")),
+            summarizer=GeminiSummarizer(os.getenv("COMPACTION_MODEL", "gemini-2.0-flash")),
+        )
+
+    @staticmethod
+    def is_summary_event(event: Event) -> bool:
+        return event.invocation_id == "compaction" and event.author == SUMMARY_AUTHOR
+
+    def _summary_event(self, session: Session) -> Event | None:
+        summary = session.state.get(SUMMARY_KEY)
+        if not summary:
+            return None
+        return Event(
+            invocation_id="compaction",
+            author=SUMMARY_AUTHOR,
+            content=Content(role="user", parts=[Part(text=SUMMARY_PREFIX + summary)]),
+            timestamp=session.state.get(COMPACTED_UNTIL_KEY, 0.0),
+        )
+
+    def _apply_window(self, session: Session) -> Session:
+        """Drops already-summarized events and puts the summary event first, in place."""
+        until = session.state.get(COMPACTED_UNTIL_KEY)
+        events = [e for e in session.events if not self.is_summary_event(e)]
+        if until is not None:
+            events = [e for e in events if e.timestamp > until]
+        summary_event = self._summary_event(session)
+        session.events[:] = ([summary_event] if summary_event else []) + events
+        return session
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        return await self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        if config is not None:
+            return await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        session = await self.inner.get_session(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            config=GetSessionConfig(num_recent_events=self.keep_last + self.threshold),
+        )
+        return self._apply_window(session) if session else None
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        return await self.inner.append_event(session, event)
+
+    async def compact(self, session: Session) -> bool:
+        """
+        Folds old events of `session` into its stored summary if the window is full.
+        Pass the Session object the Runner used last turn (e.g. from a cache) so it stays current;
+        it is trimmed in place. Returns True when a compaction happened.
+        """
+        events = [e for e in session.events if not self.is_summary_event(e)]
+        if len(events) < self.keep_last + self.threshold or session.id in self._compacting:
+            return False
+        self._compacting.add(session.id)
+        try:
+            return await self._compact(session, events)
+        finally:
+            self._compacting.discard(session.id)
+
+    async def _compact(self, session: Session, events: list[Event]) -> bool:
+        if COMPACTED_UNTIL_KEY not in session.state:
+            # First compaction of a session that predates this feature: summarize its full history once
+            full = await self.inner.get_session(app_name=session.app_name, user_id=session.user_id, session_id=session.id)
+            if full is not None:
+                newest_loaded = {e.id for e in events}
+                events = [e for e in full.events if e.id not in newest_loaded] + events
+
+        folded, kept = events[:-self.keep_last], events[-self.keep_last:]
+        until = folded[-1].timestamp
+        summary = await self.summarizer(session.state.get(SUMMARY_KEY, ""), folded)
+
+        marker = Event(
+            invocation_id=Event.new_id(),
+            author=SUMMARY_AUTHOR,
+            actions=EventActions(state_delta={SUMMARY_KEY: summary, COMPACTED_UNTIL_KEY: until}),
+        )
+        await self.inner.append_event(session, marker)
+        self._apply_window(session)
+        logger.info(f"Compacted session {session.id}: folded {len(folded)} events, kept {len(kept)}")
+        return True
+
+    def __getattr__(self, name):
+        # Anything not overridden here comes from the wrapped service
+        return getattr(self.inner, name)
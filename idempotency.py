@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+import time
+
+from caching import TTLCache
+
+IN_FLIGHT = "in_flight"
+DONE = "done"
+
+
+class UpdateLedger:
+    """
+    Remembers which Telegram updates were already taken, so redeliveries are dropped before
+    any expensive work starts.
+
+    claim(update_id) succeeds once per update: further claims fail while it is in flight or
+    after it completed. A bounded in-memory LRU answers repeats without touching the disk;
+    the SQLite table makes claims survive restarts. A claim left in flight for longer than
+    `stale_after` seconds (e.g. the process died mid-update) can be claimed again, and
+    release() gives up a claim so a failed update may be retried.
+    """
+
+    def __init__(self, path: str, memory_size: int = 10000, stale_after: float = 600, retention: float = 7 * 24 * 3600):
+        self.stale_after = stale_after
+        self.retention = retention
+        self._memory = TTLCache(maxsize=memory_size)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS processed_updates (
+                update_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                claimed_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        self.prune()
+
+    def claim(self, update_id: int) -> bool:
+        """Returns True if the caller now owns this update, False if it was seen before."""
+        if update_id in self._memory:
+            return False
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO processed_updates (update_id, status, claimed_at) VALUES (?, ?, ?)",
+                (update_id, IN_FLIGHT, now),
+            )
+            if not cur.rowcount:
+                # Seen before; only an abandoned in-flight claim may be taken over
+                cur = self._db.execute(
+                    "UPDATE processed_updates SET claimed_at = ? WHERE update_id = ? AND status = ? AND claimed_at < ?",
+                    (now, update_id, IN_FLIGHT, now - self.stale_after),
+                )
+            self._db.commit()
+            claimed = bool(cur.rowcount)
+        self._memory.set(update_id, IN_FLIGHT)
+        return claimed
+
+    def complete(self, update_id: int):
+        """Marks a claimed update as processed for good."""
+        with self._lock:
+            self._db.execute("UPDATE processed_updates SET status = ? WHERE update_id = ?", (DONE, update_id))
+            self._db.commit()
+        self._memory.set(update_id, DONE)
+
+    def release(self, update_id: int):
+        """Drops a claim (e.g. after a failure) so a redelivery of the update is processed again."""
+        with self._lock:
+            self._db.execute("DELETE FROM processed_updates WHERE update_id = ? AND status = ?", (update_id, IN_FLIGHT))
+            self._db.commit()
+        self._memory.pop(update_id)
+
+    def prune(self):
+        """Deletes entries older than `retention`; Telegram stops redelivering long before that."""
+        with self._lock:
+            self._db.execute("DELETE FROM processed_updates WHERE claimed_at < ?", (time.time() - self.retention,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
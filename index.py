@@ -1,15 +1,30 @@
 import os
-import asyncio
 import json
+import math
+import time
+import functools
 import sqlite3
+import hashlib
+import queue
+import re
 import secrets # Import for generating secure session IDs
 from dotenv import load_dotenv
 # FIX: Added 'Response' to the import list
-from flask import Flask, request, jsonify, g, redirect, url_for, make_response, Response 
+from flask import Flask, request, jsonify, g, redirect, url_for, render_template, abort, Response, stream_with_context
 # MODIFIED: Use DatabaseSessionService for persistent sessions
 from google.adk.sessions import DatabaseSessionService 
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai.types import Content, Part
+from background_loop import BackgroundLoop
+from write_behind import WriteBehindQueue
+from session_cache import CachedSessionService
+from compaction import CompactingSessionService
+from threaded_sessions import ThreadedSessionService
+from static_assets import StaticAssets
+from admission import Admission, CHAT_RATE
+from metrics import Registry, Stages, CONTENT_TYPE
+from tracing import Tracer, runner_kwargs
 
 # NOTE: The 'instance.agent' module is assumed to be available in the execution environment.
 # Ensure 'instance/agent.py' exists and exports a 'root_agent' instance for this to work.
@@ -32,29 +47,107 @@ USER_ID = "web_user" # Keeping a fixed user ID for this web demo
 DATABASE = 'history.db'
 # MODIFIED: Database URL for ADK Session Persistence now points to the same file
 DB_URL = os.getenv("SESSION_DB_URL", f"sqlite:///./{DATABASE}")
+# Page sizes for /history (messages and sessions are both cursor-paginated)
+HISTORY_PAGE_SIZE = 50
+SESSIONS_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 200
+SEARCH_PAGE_SIZE = 20
+# Shortest last word searched as a prefix (matches messages_fts' smallest prefix index)
+SEARCH_PREFIX_MIN_CHARS = 2
+# Control characters wrapped around matched terms in search snippets (the UI turns them into <mark>)
+SNIPPET_START, SNIPPET_END = "\u0002", "\u0003"
+# Connections kept open between requests (history.db runs in WAL mode, so readers never block the writer)
+DB_POOL_SIZE = int(os.getenv("HISTORY_DB_POOL_SIZE", "8"))
+# Optional write-behind: queue UI history inserts and group-commit them every HISTORY_FLUSH_INTERVAL seconds
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "0") == "1"
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.05"))
+# Warm ADK session cache: max sessions, idle seconds before expiry, and total cached events across sessions
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "1800"))
+SESSION_CACHE_MAX_EVENTS = int(os.getenv("SESSION_CACHE_MAX_EVENTS", "20000"))
+# Admission control for /chat and /chat/stream: per-session and global token buckets (requests/s and
+# burst; a rate of 0 disables it) and the most agent turns allowed in flight before new ones are shed
+ADMISSION_CHAT_RATE = float(os.getenv("ADMISSION_CHAT_RATE", "0.5"))
+ADMISSION_CHAT_BURST = float(os.getenv("ADMISSION_CHAT_BURST", "5"))
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", "20"))
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "40"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
 
 # Initialize Flask App EARLY to ensure it's available for decorators
-app = Flask(__name__)
+# Flask's own static route is disabled: the frontend is served by StaticAssets under /assets/
+app = Flask(__name__, static_folder=None)
+
+# CSS/JS bundles, hashed and compressed once at startup
+assets = StaticAssets(os.path.join(app.root_path, "static"))
+app.jinja_env.globals["asset_url"] = assets.url
+
+# --- Metrics ---
+# Request latency per endpoint plus latency/errors/in-flight per stage (session init, agent turn, history
+# writes and reads), served at /metrics in Prometheus' text format
+metrics = Registry()
+stages = Stages(metrics, "web")
+stage = stages.stage
+request_seconds = metrics.histogram("web_request_seconds", "Time to produce each response (streams: until the first byte)", ["endpoint", "method", "status"])
+stream_first_token_seconds = metrics.histogram("web_stream_first_token_seconds", "Time from the start of a /chat/stream turn to its first token")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code)
+    return response
 
 # --- Database Functions ---
 
+db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+def connect_db() -> sqlite3.Connection:
+    """Opens a history.db connection tuned for concurrent use with ADK's session service."""
+    # The timeout makes writers wait for the lock instead of failing with "database is locked"
+    db = sqlite3.connect(DATABASE, timeout=30, check_same_thread=False)
+    db.row_factory = sqlite3.Row  # Allows accessing columns by name
+    # WAL lets readers run alongside the single writer; the setting is stored in the file itself
+    db.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL only fsyncs at checkpoints; a crash of the app never loses committed rows
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA temp_store=MEMORY")
+    db.execute("PRAGMA cache_size=-16000")  # ~16 MB page cache per connection
+    return db
+
 def get_db():
-    """Returns a database connection, creating one if not present in flask.g."""
+    """Returns a pooled database connection, bound to flask.g for the rest of the request."""
     if 'db' not in g:
-        # This function connects to history.db
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row  # Allows accessing columns by name
+        try:
+            g.db = db_pool.get_nowait()
+        except queue.Empty:
+            g.db = connect_db()
     return g.db
 
 @app.teardown_appcontext
 def close_db(e=None):
-    """Closes the database connection at the end of the request."""
+    """Returns the request's connection to the pool (or closes it if the pool is full)."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        if db.in_transaction:
+            db.rollback()
+        try:
+            db_pool.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+# Background writer for UI history inserts, only when write-behind is enabled
+history_writer = WriteBehindQueue(
+    connect_db,
+    "INSERT INTO messages (session_id, role, text) VALUES (?, ?, ?)",
+    flush_interval=HISTORY_FLUSH_INTERVAL,
+) if HISTORY_WRITE_BEHIND else None
 
 def init_db():
-    """Initializes the database and creates the messages table."""
+    """Initializes the database: messages table, session summary table, indexes and triggers."""
     with app.app_context():
         db = get_db()
         # Create a table to store chat messages (for UI history display)
@@ -67,10 +160,86 @@ def init_db():
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Per-session summary maintained by a trigger, so the sidebar never aggregates 'messages'.
+        # NOTE: named chat_sessions because ADK's DatabaseSessionService owns 'sessions' in this file.
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                last_message_id INTEGER NOT NULL DEFAULT 0,
+                last_activity DATETIME NOT NULL
+            )
+        """)
+        # Message pages are read per session in id order
+        db.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)")
+        # Session pages are read by most recent message (ids are monotonic, unlike second-resolution timestamps)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_message ON chat_sessions (last_message_id DESC)")
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_session_summary
+            AFTER INSERT ON messages
+            BEGIN
+                INSERT INTO chat_sessions (session_id, message_count, last_message_id, last_activity)
+                VALUES (NEW.session_id, 1, NEW.id, NEW.timestamp)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    message_count = message_count + 1,
+                    last_message_id = NEW.id,
+                    last_activity = NEW.timestamp;
+            END
+        """)
+        # One-off backfill for databases created before the summary table existed
+        db.execute("""
+            INSERT INTO chat_sessions (session_id, message_count, last_message_id, last_activity)
+            SELECT session_id, COUNT(*), MAX(id), MAX(timestamp) FROM messages
+            WHERE NOT EXISTS (SELECT 1 FROM chat_sessions)
+            GROUP BY session_id
+        """)
+        # Full-text index over message text. External-content FTS5 stores only the index,
+        # the text itself stays in 'messages'; triggers keep both in sync.
+        # prefix='2 3' also indexes 2- and 3-character prefixes, so search-as-you-type queries
+        # like "he"* are index lookups instead of scans over every term starting with those letters.
+        fts_table = db.execute("SELECT sql FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        if fts_table and "prefix=" not in fts_table[0]:
+            db.execute("DROP TABLE messages_fts")  # created before the prefix indexes; rebuilt below
+            fts_table = None
+        db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                text,
+                content='messages',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert AFTER INSERT ON messages
+            BEGIN
+                INSERT INTO messages_fts (rowid, text) VALUES (NEW.id, NEW.text);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete AFTER DELETE ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update AFTER UPDATE OF text ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+                INSERT INTO messages_fts (rowid, text) VALUES (NEW.id, NEW.text);
+            END
+        """)
+        if not fts_table:
+            # Index the messages written before the FTS table existed
+            db.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
         db.commit()
 
+@stage("save_message")
 def save_message(session_id: str, role: str, text: str):
-    """Saves a single message to the database."""
+    """Saves a single message to the database (queued for a batched commit when write-behind is on)."""
+    if history_writer:
+        history_writer.put((session_id, role, text))
+        return
     try:
         db = get_db()
         db.execute(
@@ -81,90 +250,225 @@ def save_message(session_id: str, role: str, text: str):
     except Exception as e:
         app.logger.error(f"Database Save Error: {e}")
 
-def load_history(session_id: str) -> list[dict]:
-    """Loads all messages for a given session ID."""
+@stage("load_history")
+def load_history(session_id: str, before: int | None = None, limit: int = HISTORY_PAGE_SIZE) -> tuple[list[dict], int | None]:
+    """
+    Loads one page of messages for a session, oldest first.
+    Returns the most recent `limit` messages older than message id `before` (or the latest ones),
+    plus the cursor for the next (older) page, or None when there are no older messages.
+    """
     try:
         db = get_db()
         rows = db.execute(
-            "SELECT role, text FROM messages WHERE session_id = ? ORDER BY timestamp ASC",
-            (session_id,)
+            """
+            SELECT id, role, text FROM messages
+            WHERE session_id = ? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            # Fetch one extra row to learn whether an older page exists
+            (session_id, before if before is not None else 2**63 - 1, limit + 1)
         ).fetchall()
-        return [{"role": row['role'], "text": row['text']} for row in rows]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        messages = [{"id": row['id'], "role": row['role'], "text": row['text']} for row in reversed(rows)]
+        next_cursor = messages[0]["id"] if has_more else None
+        return messages, next_cursor
     except Exception as e:
         app.logger.error(f"Database Load Error: {e}")
-        return []
+        return [], None
 
-def get_all_session_ids() -> list[str]:
-    """Loads all unique session IDs from the database."""
+@stage("load_history")
+def load_history_since(session_id: str, since_id: int, limit: int = MAX_PAGE_SIZE) -> tuple[list[dict], bool]:
+    """
+    Loads the messages of a session newer than message id `since_id`, oldest first.
+    The second value is True when more than `limit` new messages exist (fetch again from the last id).
+    """
     try:
         db = get_db()
         rows = db.execute(
-            # Order by timestamp of the last message in that session for better display logic
             """
-            SELECT T1.session_id FROM messages T1
-            INNER JOIN (
-                SELECT session_id, MAX(timestamp) AS max_timestamp
-                FROM messages
-                GROUP BY session_id
-            ) T2 ON T1.session_id = T2.session_id AND T1.timestamp = T2.max_timestamp
-            GROUP BY T1.session_id
-            ORDER BY T2.max_timestamp DESC
+            SELECT id, role, text FROM messages
+            WHERE session_id = ? AND id > ?
+            ORDER BY id ASC
+            LIMIT ?
+            """,
+            (session_id, since_id, limit + 1)
+        ).fetchall()
+        messages = [{"id": row['id'], "role": row['role'], "text": row['text']} for row in rows[:limit]]
+        return messages, len(rows) > limit
+    except Exception as e:
+        app.logger.error(f"Database Load Error: {e}")
+        return [], False
+
+def history_etag() -> str | None:
+    """
+    Builds the /history validator from the query string and the newest message id.
+    Every /history response only changes when a message is inserted, so this check is a single
+    rowid lookup and lets unchanged polls return 304 without running the page queries.
+    """
+    try:
+        latest_id = get_db().execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+    except Exception as e:
+        app.logger.error(f"Database ETag Error: {e}")
+        return None
+    return hashlib.sha1(f"{request.query_string.decode()}|{latest_id}".encode()).hexdigest()
+
+@stage("load_sessions")
+def load_sessions(before: int | None = None, limit: int = SESSIONS_PAGE_SIZE) -> tuple[list[str], int | None]:
+    """
+    Loads one page of session IDs, most recently active first, from the chat_sessions summary table.
+    `before` is the cursor returned by the previous page; the second value is the next cursor or None.
+    """
+    try:
+        db = get_db()
+        rows = db.execute(
             """
+            SELECT session_id, last_message_id FROM chat_sessions
+            WHERE last_message_id < ?
+            ORDER BY last_message_id DESC
+            LIMIT ?
+            """,
+            (before if before is not None else 2**63 - 1, limit + 1)
         ).fetchall()
-        return [row['session_id'] for row in rows]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = rows[-1]['last_message_id'] if has_more else None
+        return [row['session_id'] for row in rows], next_cursor
     except Exception as e:
         app.logger.error(f"Database Session Load Error: {e}")
-        return []
+        return [], None
 
+def fts_query(text: str) -> str:
+    """
+    Turns free text into a safe FTS5 query: every word must match, the last one as a prefix
+    (so results appear while typing) once it has SEARCH_PREFIX_MIN_CHARS characters; shorter
+    prefixes match most of the index and rank far too slowly. Returns '' when the text has no
+    searchable words.
+    """
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return ""
+    # Quoting each term keeps FTS5 operators and punctuation in user input from being parsed
+    match = " ".join(f'"{term}"' for term in terms)
+    return match + "*" if len(terms[-1]) >= SEARCH_PREFIX_MIN_CHARS else match
+
+@stage("search")
+def search_messages(query: str, offset: int = 0, limit: int = SEARCH_PAGE_SIZE) -> tuple[list[dict], int | None]:
+    """
+    Full-text search across all sessions, best matches first (FTS5 bm25 rank).
+    Returns one page of hits with highlighted snippets and the offset of the next page (or None).
+    """
+    match = fts_query(query)
+    if not match:
+        return [], None
+    try:
+        db = get_db()
+        rows = db.execute(
+            """
+            SELECT m.id, m.session_id, m.role, m.timestamp,
+                   snippet(messages_fts, 0, ?, ?, '…', 12) AS snippet
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+            ORDER BY messages_fts.rank
+            LIMIT ? OFFSET ?
+            """,
+            (SNIPPET_START, SNIPPET_END, match, limit + 1, offset)
+        ).fetchall()
+        hits = [
+            {
+                "id": row['id'],
+                "session_id": row['session_id'],
+                "role": row['role'],
+                "timestamp": row['timestamp'],
+                "snippet": row['snippet'],
+            }
+            for row in rows[:limit]
+        ]
+        return hits, offset + limit if len(rows) > limit else None
+    except Exception as e:
+        app.logger.error(f"Database Search Error: {e}")
+        return [], None
+
+
+# One long-lived event loop shared by every request. The Runner, the session service
+# and the async clients inside ADK all stay bound to it instead of a fresh asyncio.run() loop per call.
+adk_loop = BackgroundLoop()
 
 # MODIFIED: Initialize DatabaseSessionService using the consolidated DB_URL
-session_service = DatabaseSessionService(db_url=DB_URL)
+# Warm sessions are served from a bounded LRU/TTL cache; only cold ones are loaded from the database.
+# Cold loads read just the newest events plus a stored summary of the rest (see compaction.py).
+# ADK's database calls block, so they run on session I/O threads rather than on adk_loop itself.
+# For SQLite, ADK's connections wait up to 30 s on the shared file's write lock instead of failing
+# fast; that wait only holds a session I/O thread, never adk_loop and the other chats' model calls.
+compactor = CompactingSessionService.from_env(
+    ThreadedSessionService(DatabaseSessionService(
+        db_url=DB_URL,
+        **({"connect_args": {"timeout": 30}} if DB_URL.startswith("sqlite") else {}),
+    ))
+)
+session_service = CachedSessionService(
+    compactor,
+    maxsize=SESSION_CACHE_SIZE,
+    ttl=SESSION_CACHE_TTL,
+    max_events=SESSION_CACHE_MAX_EVENTS,
+)
+
+# Optional tracing (TRACE_FILE=<path>): spans for each turn's model calls, tool calls and session I/O,
+# appended to that file as OTLP/JSON
+tracer = Tracer.from_env("adk-web")
 
 # Create the runner with the agent only if root_agent was successfully imported
 runner = None
-# We no longer need adk_sessions dictionary to track initialization, 
-# as DatabaseSessionService manages persistence, but we keep it for now for simplicity 
-adk_sessions = {} # Dictionary to track which sessions have been accessed since restart
 
 if root_agent:
     runner = Runner(
         agent=root_agent,
         app_name=APP_NAME,
-        session_service=session_service,
+        **runner_kwargs(tracer, session_service),
     )
 
     async def initialize_adk_session(session_id: str):
         """
         Ensures the ADK session is accessible and created if it doesn't exist.
-        The DatabaseSessionService handles loading persistent history.
+        Warm sessions are answered from the in-memory session cache; cold ones load from the database.
         """
-        if session_id not in adk_sessions:
-            app.logger.info(f"Initializing ADK session check for {USER_ID}/{session_id}")
+        try:
+            # FIX: Corrected the way arguments are passed to get_session. 
+            # Using keyword arguments for robustness.
             
-            try:
-                # FIX: Corrected the way arguments are passed to get_session. 
-                # Using keyword arguments for robustness.
-                
-                session = await session_service.get_session(
-                    app_name=APP_NAME, 
-                    user_id=USER_ID, 
+            session = await session_service.get_session(
+                app_name=APP_NAME, 
+                user_id=USER_ID, 
+                session_id=session_id
+            )
+            
+            if not session:
+                app.logger.info(f"Creating ADK session {USER_ID}/{session_id}")
+                # FIX: Removed the unexpected 'history=[]' argument from create_session call
+                await session_service.create_session(
+                    app_name=APP_NAME,
+                    user_id=USER_ID,
                     session_id=session_id
                 )
-                
-                if not session:
-                    # FIX: Removed the unexpected 'history=[]' argument from create_session call
-                    await session_service.create_session(
-                        app_name=APP_NAME,
-                        user_id=USER_ID,
-                        session_id=session_id
-                    )
-
-            except Exception as e:
-                 # Catch initialization errors specific to the DatabaseSessionService
-                app.logger.error(f"DatabaseSessionService Initialization Error: {e}")
-                raise 
-            
-            adk_sessions[session_id] = True
+
+        except Exception as e:
+             # Catch initialization errors specific to the DatabaseSessionService
+            app.logger.error(f"DatabaseSessionService Initialization Error: {e}")
+            raise 
+
+    async def compact_adk_session(session_id: str):
+        """Folds old events of a long session into its summary once the recent-event window is full."""
+        if not isinstance(compactor, CompactingSessionService):
+            return
+        try:
+            # The cached Session is the one the Runner just appended to, so it is trimmed in place
+            session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+            if session:
+                await compactor.compact(session)
+        except Exception as e:
+            app.logger.error(f"Session Compaction Error: {e}")
 
 
 # --- Helper to get/create session ID from request ---
@@ -180,46 +484,162 @@ def get_or_create_session_id():
 
 # --- API Endpoints ---
 
+def page_size_arg(name: str, default: int) -> int:
+    """Reads a page size from the query string, clamped to 1..MAX_PAGE_SIZE."""
+    value = request.args.get(name, default, type=int)
+    return max(1, min(value, MAX_PAGE_SIZE))
+
 @app.route('/history', methods=['GET'])
 def get_history_api():
-    """Returns the chat history and all sessions for the current session ID."""
+    """
+    Returns a page of chat history and a page of sessions for the current session ID.
+
+    Without cursors both first pages are returned. Passing a cursor fetches only that list:
+      - before=<history_cursor>           older messages of the current session
+      - sessions_before=<sessions_cursor> the next page of sessions
+    Page sizes can be set with 'limit' and 'sessions_limit'.
+
+    Delta mode: since_id=<last seen message id> returns only newer messages of the current
+    session ('has_more' is set if another call is needed) plus the first page of sessions.
+
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
+    """
     current_session_id = request.args.get('session_id')
     if not current_session_id:
         return jsonify({"history": [], "sessions": []}), 200
 
-    history = load_history(current_session_id)
-    sessions = get_all_session_ids()
-    
-    return jsonify({
-        "history": history,
-        "current_session_id": current_session_id,
-        "sessions": sessions
-    })
+    etag = history_etag()
+    if etag and etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    """Handles incoming user messages, runs the ADK agent, and returns the response."""
+    before = request.args.get('before', type=int)
+    since_id = request.args.get('since_id', type=int)
+    sessions_before = request.args.get('sessions_before', type=int)
+    payload = {"current_session_id": current_session_id}
+
+    if since_id is not None:
+        history, has_more = load_history_since(current_session_id, since_id, page_size_arg('limit', MAX_PAGE_SIZE))
+        payload.update(history=history, has_more=has_more)
+    elif sessions_before is None:
+        history, history_cursor = load_history(current_session_id, before, page_size_arg('limit', HISTORY_PAGE_SIZE))
+        payload.update(history=history, history_cursor=history_cursor)
+    if before is None:
+        sessions, sessions_cursor = load_sessions(sessions_before, page_size_arg('sessions_limit', SESSIONS_PAGE_SIZE))
+        payload.update(sessions=sessions, sessions_cursor=sessions_cursor)
+
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+        # Let the browser keep the body but always revalidate it
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    Searches the text of all chat messages: /search?q=<words>[&offset=<next_offset>][&limit=<n>].
+    Matched terms in each snippet are wrapped in SNIPPET_START ... SNIPPET_END.
+    """
+    query = (request.args.get('q') or '').strip()
+    offset = max(0, request.args.get('offset', 0, type=int))
+    results, next_offset = search_messages(query, offset, page_size_arg('limit', SEARCH_PAGE_SIZE))
+    return jsonify({"query": query, "results": results, "next_offset": next_offset})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Returns runtime counters: the warm ADK session cache and admission control (queue depth, rejections)."""
+    return jsonify({"session_cache": session_service.stats(), "admission": admission.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint: the request/stage metrics above plus the /stats counters."""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+# --- Admission Control ---
+# Sheds chat requests up front (429 + Retry-After) instead of letting them queue behind the model,
+# so one chatty session cannot use up the quota and everyone else keeps predictable latency.
+admission = Admission(
+    chat_rate=ADMISSION_CHAT_RATE,
+    chat_burst=ADMISSION_CHAT_BURST,
+    global_rate=ADMISSION_GLOBAL_RATE,
+    global_burst=ADMISSION_GLOBAL_BURST,
+    max_queue=ADMISSION_MAX_QUEUE,
+)
+
+def admitted(view):
+    """Runs the view only if admission control lets the request in; the slot is freed once the response (or stream) closes."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        rejected = admission.admit(request.args.get('session_id') or request.remote_addr)
+        if rejected:
+            reason, retry_after = rejected
+            if reason == CHAT_RATE:
+                message = "You're sending messages faster than I can answer. Please wait a moment and try again."
+            else:
+                message = "I'm handling a lot of conversations right now. Please try again in a minute."
+            return jsonify({"response": message}), 429, {"Retry-After": str(math.ceil(retry_after))}
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            admission.done()
+            raise
+        response.call_on_close(admission.done)
+        return response
+    return wrapper
+
+metrics.collect("web_session_cache", session_service.stats)
+metrics.collect("web_admission", admission.stats)
+
+def prepare_chat_request():
+    """
+    Validates a chat request and makes sure its ADK session exists.
+    Returns (session_id, user_input, None) on success or (None, None, error_response).
+    """
     current_session_id = request.args.get('session_id')
     if not current_session_id:
-        return jsonify({"response": "Error: Session ID is missing."}), 400
+        return None, None, (jsonify({"response": "Error: Session ID is missing."}), 400)
 
     if not runner:
-        return jsonify({"response": "Error: Agent runner is not initialized. Check server logs."}), 500
+        return None, None, (jsonify({"response": "Error: Agent runner is not initialized. Check server logs."}), 500)
 
     # Ensure the ADK session is initialized/loaded from the database
-    if root_agent and current_session_id not in adk_sessions:
+    if root_agent:
         try:
-             # Synchronously call the async session initializer
-             asyncio.run(initialize_adk_session(current_session_id))
+             # Run the async session initializer on the shared loop and wait for it
+             with stage("session_init"):
+                 adk_loop.run(initialize_adk_session(current_session_id))
         except Exception as e:
             app.logger.error(f"ADK Session Initialization Error: {e}")
-            return jsonify({"response": f"ADK Session Init Error: {str(e)}"}), 500
+            return None, None, (jsonify({"response": f"ADK Session Init Error: {str(e)}"}), 500)
 
     data = request.get_json()
     user_input = data.get('message', '').strip()
 
     if not user_input:
-        return jsonify({"response": "Please provide a message."}), 400
+        return None, None, (jsonify({"response": "Please provide a message."}), 400)
+
+    return current_session_id, user_input, None
+
+def event_text(event) -> str:
+    """Joins the text parts of an ADK event, returning '' when it carries no text."""
+    content = getattr(event, "content", None)
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if getattr(part, "text", None))
+
+def sse_message(event: str, data: dict) -> str:
+    """Formats a single Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat', methods=['POST'])
+@admitted
+def chat():
+    """Handles incoming user messages, runs the ADK agent, and returns the response."""
+    current_session_id, user_input, error_response = prepare_chat_request()
+    if error_response:
+        return error_response
 
     # 1. Save user message to UI history DB (history.db)
     save_message(current_session_id, "user", user_input)
@@ -233,16 +653,18 @@ def chat():
         """Asynchronously runs the agent and extracts the final text response."""
         response = ""
         try:
-            async for event in runner.run_async(
-                user_id=USER_ID,
-                session_id=session_id,
-                new_message=msg
-            ):
-                if hasattr(event, "is_final_response") and event.is_final_response():
-                    if hasattr(event, "content") and event.content.parts:
-                        # Extract text from the first part of the content
-                        response = event.content.parts[0].text
-                        break
+            # Root span for the turn; the tracing plugin hangs the model/tool/session spans under it
+            with tracer.span("web.turn", session_id=session_id):
+                async for event in runner.run_async(
+                    user_id=USER_ID,
+                    session_id=session_id,
+                    new_message=msg
+                ):
+                    if hasattr(event, "is_final_response") and event.is_final_response():
+                        if hasattr(event, "content") and event.content.parts:
+                            # Extract text from the first part of the content
+                            response = event.content.parts[0].text
+                            break
         except Exception as e:
             # Handle potential ADK/Runner exceptions
             return f"An agent error occurred: {str(e)}"
@@ -250,9 +672,12 @@ def chat():
         return response
 
     try:
-        final_response = asyncio.run(get_agent_response(message, current_session_id))
+        # Keyed by session: overlapping turns of one chat run in order instead of racing on the same session
+        with stage("agent"):
+            final_response = adk_loop.run(get_agent_response(message, current_session_id), key=current_session_id)
         
         if final_response.startswith("An agent error occurred"):
+            stages.errors.inc(stage="agent")
             response_text = final_response
             status_code = 500
         else:
@@ -262,6 +687,8 @@ def chat():
             # 2. Save agent message to UI history DB (history.db) on success
             # The agent's history is automatically saved by DatabaseSessionService
             save_message(current_session_id, "agent", response_text)
+            # Summarize in the background, queued behind this session's turns so it never edits a session mid-run
+            adk_loop.submit(compact_adk_session(current_session_id), key=current_session_id)
 
     except Exception as e:
         response_text = f"Flask runtime error: {str(e)}"
@@ -269,6 +696,65 @@ def chat():
         
     return jsonify({"response": response_text}), status_code
 
+@app.route('/chat/stream', methods=['POST'])
+@admitted
+def chat_stream():
+    """
+    Same as /chat, but streams the agent's partial text as Server-Sent Events.
+    Emits 'token' frames while the model generates, then a single 'done' (or 'error') frame.
+    The agent message is saved to the UI history once the stream completes.
+    """
+    current_session_id, user_input, error_response = prepare_chat_request()
+    if error_response:
+        return error_response
+
+    save_message(current_session_id, "user", user_input)
+    message = Content(role="user", parts=[Part(text=user_input)])
+
+    def generate():
+        # Flask streams from a sync generator; the events themselves are produced on the shared loop
+        events = adk_loop.iterate(runner.run_async(
+            user_id=USER_ID,
+            session_id=current_session_id,
+            new_message=message,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ), key=current_session_id)
+        streamed = ""
+        final_response = None
+        started = time.perf_counter()
+        try:
+            for event in events:
+                text = event_text(event)
+                if getattr(event, "partial", False):
+                    if text:
+                        if not streamed:
+                            stream_first_token_seconds.observe(time.perf_counter() - started)
+                        streamed += text
+                        yield sse_message("token", {"text": text})
+                elif event.is_final_response():
+                    final_response = text or streamed
+                    break
+        except Exception as e:
+            app.logger.error(f"Agent Stream Error: {e}")
+            stages.errors.inc(stage="agent_stream")
+            yield sse_message("error", {"response": f"An agent error occurred: {str(e)}"})
+            return
+        finally:
+            events.close()
+            stages.seconds.observe(time.perf_counter() - started, stage="agent_stream")
+
+        final_response = final_response if final_response is not None else streamed
+        save_message(current_session_id, "agent", final_response)
+        adk_loop.submit(compact_adk_session(current_session_id), key=current_session_id)
+        yield sse_message("done", {"response": final_response})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # Stop proxies (e.g. nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.route('/')
 def index():
@@ -282,339 +768,16 @@ def index():
     
     current_session_id = session_id_result
 
-    # 2. Pass the current session ID to the HTML generator
-    html_content = get_html_content(current_session_id)
-    response = make_response(html_content)
-    return response
-
-# --- Frontend HTML/JS/CSS (Inlined for single-file deployment) ---
+    # 2. Render the page shell; only the session ID is injected, CSS/JS are cached static assets
+    return render_template("index.html", session_id=current_session_id)
 
-def get_html_content(current_session_id):
-    """Generates the single HTML page with inline CSS and JavaScript for the chat UI."""
-    
-    html_template = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>ADK Agent Web Chat - Session {current_session_id}</title>
-        <!-- Load Tailwind CSS CDN -->
-        <script src="https://cdn.tailwindcss.com"></script>
-        <style>
-            /* Custom Scrollbar for Chat Window */
-            .chat-window::-webkit-scrollbar {{
-                width: 8px;
-            }}
-            .chat-window::-webkit-scrollbar-thumb {{
-                background-color: #a3a3a3; /* gray-400 */
-                border-radius: 4px;
-            }}
-            .chat-window::-webkit-scrollbar-track {{
-                background-color: #f3f4f6; /* gray-100 */
-            }}
-            /* Use Inter font */
-            body {{
-                font-family: 'Inter', sans-serif;
-            }}
-        </style>
-        <script>
-            // Set up Tailwind configuration for the Inter font
-            tailwind.config = {{
-                theme: {{
-                    extend: {{
-                        fontFamily: {{
-                            sans: ['Inter', 'sans-serif'],
-                        }}
-                    }}
-                }}
-            }}
-        </script>
-    </head>
-    <!-- MODIFIED: Wrapper for the whole layout, using vh to fill screen -->
-    <body class="bg-gray-100 min-h-screen flex w-full"> 
-        
-        <!-- Sidebar for Session History -->
-        <!-- MODIFIED: Fixed sidebar on mobile, static on desktop. 
-                     Uses transform to hide/show off-screen on mobile. -->
-        <div id="sidebar" class="fixed top-0 left-0 h-screen w-64 bg-white shadow-2xl ring-1 ring-gray-200 overflow-y-auto p-4 flex-shrink-0 z-50 
-               transform -translate-x-full transition-transform duration-300
-               lg:static lg:transform-none lg:h-[calc(100vh-2rem)] lg:mt-4 lg:mb-4 lg:ml-4 lg:mr-0 lg:rounded-xl">
-            <h2 class="text-xl font-bold text-gray-800 mb-4 border-b pb-2">Sessions</h2>
-            <a href="/" id="new-chat-link" class="block w-full text-center py-2 mb-4 bg-green-500 text-white font-semibold rounded-lg hover:bg-green-600 transition duration-200">
-                + New Chat
-            </a>
-            <div id="session-list" class="space-y-1">
-                <!-- Session links will be populated here -->
-            </div>
-        </div>
-        
-        <!-- Main Chat Area -->
-        <!-- MODIFIED: Full width (w-full) on all screens, uses flex-grow to take space. 
-                     Uses h-screen on mobile and h-[calc(100vh-2rem)] on desktop for better fit. -->
-        <div class="w-full bg-white shadow-2xl ring-1 ring-gray-200 rounded-none overflow-hidden flex flex-col h-screen flex-grow 
-             lg:h-[calc(100vh-2rem)] lg:mt-4 lg:mb-4 lg:mr-4 lg:rounded-xl">
-            
-            <!-- Header -->
-            <!-- ADDED: Hamburger button and flex layout to place it on the left -->
-            <header class="p-4 bg-indigo-600 text-white shadow-lg rounded-t-none lg:rounded-t-xl flex items-center">
-                <!-- Hamburger Button, visible only below large screen size -->
-                <button id="menu-button" class="lg:hidden p-2 mr-3 rounded-md hover:bg-indigo-700 transition duration-200 focus:outline-none focus:ring-2 focus:ring-white">
-                    <svg class="w-6 h-6" fill="none" stroke="currentColor" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 6h16M4 12h16M4 18h16"></path></svg>
-                </button>
-                <div class="flex-grow">
-                    <h1 class="text-2xl font-extrabold tracking-tight">ADK Agent Chat</h1>
-                    <p class="text-sm opacity-80 mt-1">Current Session: <b id="current-session-display">{current_session_id}</b></p>
-                </div>
-            </header>
-
-            <!-- Chat Window (Content will be filled by JavaScript on load) -->
-            <div id="chat-window" class="chat-window flex-grow overflow-y-auto p-4 space-y-4">
-                <!-- Chat messages go here -->
-            </div>
-
-            <!-- Input Form -->
-            <div class="p-4 border-t border-gray-200 bg-white">
-                <form id="chat-form" class="flex space-x-3">
-                    <input 
-                        type="text" 
-                        id="user-input" 
-                        placeholder="Type your message here..." 
-                        required
-                        autocomplete="off"
-                        class="flex-grow p-3 border-2 border-gray-300 rounded-xl focus:ring-indigo-500 focus:border-indigo-500 transition duration-200"
-                    />
-                    <button 
-                        type="submit" 
-                        id="send-button"
-                        class="bg-indigo-600 text-white p-3 rounded-xl font-bold shadow-lg hover:bg-indigo-700 transition duration-200 active:scale-[0.98] disabled:bg-gray-400"
-                    >
-                        Send
-                    </button>
-                </form>
-            </div>
-        </div>
-
-        <script>
-            document.addEventListener('DOMContentLoaded', () => {{
-                const currentSessionId = "{current_session_id}";
-                const form = document.getElementById('chat-form');
-                const userInput = document.getElementById('user-input');
-                const chatWindow = document.getElementById('chat-window');
-                const sendButton = document.getElementById('send-button');
-                const sidebar = document.getElementById('sidebar');
-                const menuButton = document.getElementById('menu-button');
-                const sessionList = document.getElementById('session-list');
-
-                // --- Sidebar Logic ---
-                const overlay = document.createElement('div');
-                overlay.className = 'fixed inset-0 bg-black opacity-0 transition-opacity duration-300 z-40 lg:hidden pointer-events-none';
-                document.body.appendChild(overlay);
-
-                let isSidebarOpen = false;
-
-                function toggleSidebar(open) {{
-                    // Only run on mobile (screen width < 1024px, the 'lg' breakpoint)
-                    if (window.innerWidth >= 1024) return;
-                    
-                    isSidebarOpen = (open !== undefined) ? open : !isSidebarOpen;
-
-                    if (isSidebarOpen) {{
-                        sidebar.classList.remove('-translate-x-full');
-                        overlay.classList.remove('opacity-0', 'pointer-events-none');
-                        overlay.classList.add('opacity-50', 'pointer-events-auto');
-                    }} else {{
-                        sidebar.classList.add('-translate-x-full');
-                        overlay.classList.remove('opacity-50', 'pointer-events-auto');
-                        overlay.classList.add('opacity-0', 'pointer-events-none');
-                    }}
-                }}
-
-                menuButton.addEventListener('click', () => {{
-                    toggleSidebar();
-                }});
-                
-                // Close sidebar when clicking the overlay
-                overlay.addEventListener('click', () => {{
-                    toggleSidebar(false);
-                }});
-
-                // --- End Sidebar Logic ---
-
-                // Function to add a message to the chat window
-                function addMessage(text, role) {{
-                    const isUser = role === 'user';
-                    const messageElement = document.createElement('div');
-                    
-                    if (isUser) {{
-                        messageElement.className = 'flex justify-end';
-                        messageElement.innerHTML = `
-                            <div class="bg-indigo-600 text-white p-4 rounded-xl rounded-br-sm max-w-[80%] shadow-lg break-words whitespace-pre-wrap">
-                                <!-- Placeholder will be filled with text content -->
-                            </div>
-                        `;
-                    }} else {{ // agent
-                        messageElement.className = 'flex justify-start';
-                        messageElement.innerHTML = `
-                            <div class="bg-gray-200 text-gray-800 p-4 rounded-xl rounded-tl-sm max-w-[80%] shadow-lg break-words whitespace-pre-wrap">
-                                <!-- Placeholder will be filled with text content -->
-                            </div>
-                        `;
-                    }}
-                    
-                    // Sanitize text and handle HTML content
-                    const contentDiv = messageElement.querySelector('div:last-child');
-                    
-                    if (role === 'agent' && text.includes('<b')) {{
-                        contentDiv.innerHTML = text; 
-                    }} else {{
-                        contentDiv.textContent = text;
-                    }}
-                    
-                    chatWindow.appendChild(messageElement);
-                    // Scroll to the latest message
-                    chatWindow.scrollTop = chatWindow.scrollHeight;
-                }}
-
-                // Function to populate the sidebar with session links
-                function populateSessionList(sessions) {{
-                    sessionList.innerHTML = ''; // Clear existing list
-                    sessions.forEach(sessionId => {{
-                        const link = document.createElement('a');
-                        link.href = `/?session_id=${'{sessionId}'}`;
-                        
-                        link.className = `block p-2 text-sm rounded-lg hover:bg-gray-200 transition duration-150 truncate \
-                            $${{sessionId}} === currentSessionId ? 'bg-indigo-100 font-semibold text-indigo-700' : 'text-gray-700'`;
-                        
-                        link.textContent = `Chat #$${{sessionId}}`; // Escaped again for text content
-                        link.addEventListener('click', () => toggleSidebar(false)); // Close sidebar on session change
-                        sessionList.appendChild(link);
-                    }});
-                }}
-                
-                // Function to load and display chat history and sessions
-                async function loadChatData() {{
-                    try {{
-                        const response = await fetch(`/history?session_id=${'{currentSessionId}'}`);
-                        const data = await response.json();
-                        
-                        // 1. Clear chat window first
-                        chatWindow.innerHTML = '';
-
-                        // 2. Load History
-                        const history = data.history || [];
-                        if (history.length === 0) {{
-                            addMessage(`Welcome to Chat #<b class='text-indigo-700'>${'{currentSessionId}'}</b>! I am your ADK Agent, ready to assist you. Ask me anything!`, 'agent');
-                        }} else {{
-                            history.forEach(msg => {{
-                                if (msg.role && msg.text) {{
-                                    addMessage(msg.text, msg.role);
-                                }}
-                            }});
-                        }}
-                        
-                        // 3. Populate Session List
-                        populateSessionList(data.sessions || []);
-
-                    }} catch (error) {{
-                        console.error('Failed to load chat data:', error);
-                        // Fallback welcome message
-                        chatWindow.innerHTML = '';
-                        addMessage('Network or database error. Please refresh. If this is a new session, you can start chatting.', 'agent');
-                    }}
-                }}
-
-                // Load chat data when the page loads
-                loadChatData();
-
-                // Function to show a loading state
-                function showLoading() {{
-                    let loadingDiv = document.getElementById('loading-message');
-                    if (!loadingDiv) {{
-                        loadingDiv = document.createElement('div');
-                        loadingDiv.id = 'loading-message';
-                        loadingDiv.className = 'flex justify-start';
-                        loadingDiv.innerHTML = `
-                            <div class="bg-gray-200 text-gray-600 p-4 rounded-xl rounded-tl-sm max-w-[80%] shadow-md">
-                                <span class="animate-pulse">Agent is thinking...</span>
-                            </div>
-                        `;
-                        chatWindow.appendChild(loadingDiv);
-                        chatWindow.scrollTop = chatWindow.scrollHeight;
-                    }}
-                    return loadingDiv;
-                }}
-
-                // Function to hide the loading state
-                function hideLoading() {{
-                    const loadingDiv = document.getElementById('loading-message');
-                    if (loadingDiv) {{
-                        loadingDiv.remove();
-                    }}
-                }}
-
-                // Handle form submission
-                form.addEventListener('submit', async (e) => {{
-                    e.preventDefault();
-                    
-                    const message = userInput.value.trim();
-                    if (!message) return;
-
-                    // 1. Display user message
-                    addMessage(message, 'user');
-                    
-                    // 2. Clear input and disable input/button
-                    userInput.value = '';
-                    sendButton.disabled = true;
-                    userInput.disabled = true;
-
-                    // 3. Show loading indicator
-                    showLoading();
-
-                    try {{
-                        // 4. Send message to Flask backend, including session_id in the query
-                        const response = await fetch(`/chat?session_id=${'{currentSessionId}'}`, {{
-                            method: 'POST',
-                            headers: {{
-                                'Content-Type': 'application/json',
-                            }},
-                            body: JSON.stringify({{ message: message }})
-                        }});
-
-                        const data = await response.json();
-
-                        // 5. Hide loading indicator
-                        hideLoading();
-
-                        // 6. Display agent response
-                        if (response.ok) {{
-                            addMessage(data.response, 'agent');
-                            // After a successful chat, reload session list in case a new message updates the session list
-                            loadChatData(); 
-                        }} else {{
-                            addMessage(`Error: ${'{data.response}'}`, 'agent');
-                            console.error('Agent API Error:', data.response);
-                        }}
-
-                    }} catch (error) {{
-                        // 5. Hide loading indicator on error
-                        hideLoading();
-                        // 6. Display network error
-                        addMessage('Network Error: Could not reach the server.', 'agent');
-                        console.error('Fetch Error:', error);
-                    }} finally {{
-                        // 7. Re-enable input/button
-                        sendButton.disabled = false;
-                        userInput.disabled = false;
-                        userInput.focus();
-                    }}
-                }});
-            }});
-        </script>
-    </body>
-    </html>
-    """
-    return html_template
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serves a content-hashed, precompressed static asset with long-lived caching headers."""
+    response = assets.response(filename)
+    if response is None:
+        abort(404)
+    return response
 
 # --- Run the Flask App ---
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+import itertools
+import logging
+import threading
+from collections import deque
+
+from caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedJobQueue:
+    """
+    Worker pool that runs jobs in FIFO order per key and in parallel across keys.
+
+    Jobs submitted under the same key (e.g. a Telegram chat id) never overlap and run in
+    submission order; jobs under different keys are spread over `workers` threads. A key
+    with a backlog yields its worker after each job, so one busy chat cannot starve others.
+    """
+
+    def __init__(self, handler, workers: int = 8, name: str = "jobs"):
+        self.handler = handler
+        self._pending = {}  # key -> deque of job args, only for keys queued or running
+        self._ready = deque()  # keys with pending jobs and no worker on them
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, *args):
+        """Queues handler(*args) behind any earlier jobs for `key`."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("job queue is closed")
+            jobs = self._pending.get(key)
+            if jobs is None:
+                self._pending[key] = deque([args])
+                self._ready.append(key)
+                self._cond.notify()
+            else:
+                jobs.append(args)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._closed:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                args = self._pending[key].popleft()
+
+            try:
+                self.handler(*args)
+            except Exception:
+                logger.exception(f"Job for {key!r} failed")
+
+            with self._cond:
+                if self._pending[key]:
+                    # More work for this key: back of the line, so other keys get a turn
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._pending[key]
+                    if not self._pending:
+                        self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Number of jobs queued or running."""
+        with self._cond:
+            return sum(len(jobs) for jobs in self._pending.values()) + len(self._pending) - len(self._ready)
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Waits until every submitted job has finished; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def close(self, timeout: float | None = None):
+        """Stops accepting jobs, lets queued ones finish and stops the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+class Generations:
+    """
+    Per-key counters for superseding background work, e.g. a voice reply that is no longer
+    wanted once the same chat sends a newer message. bump() on each new message, capture
+    current() when starting work, and check is_stale() before each expensive step.
+
+    Only the latest generation of the `maxsize` most recent keys is kept, for up to `ttl`
+    seconds, so memory stays bounded however many chats there have been. Generations come
+    from one process-wide sequence and are never reused, so work whose key was evicted is
+    simply stale.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float | None = 3600):
+        self._latest = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def bump(self, key) -> int:
+        with self._lock:
+            generation = next(self._sequence)
+            self._latest.set(key, generation)
+            return generation
+
+    def current(self, key) -> int:
+        return self._latest.get(key, 0)
+
+    def is_stale(self, key, generation: int) -> bool:
+        return self.current(key) != generation
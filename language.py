@@ -0,0 +1,109 @@
+import logging
+import threading
+
+from caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Codes that differ between langdetect / Telegram (IETF tags) and gTTS
+GTTS_ALIASES = {"he": "iw", "jv": "jw", "zh-hans": "zh-CN", "zh-hant": "zh-TW", "zh-cn": "zh-CN", "zh-tw": "zh-TW"}
+
+
+def _gtts_languages() -> dict:
+    try:
+        from gtts.lang import tts_langs
+        return {code.lower(): code for code in tts_langs()}
+    except Exception:
+        return {}
+
+
+def langdetect_detector():
+    """
+    langdetect with a fixed seed, so the same text always gets the same answer. Returns a
+    function text -> [(code, probability), ...], most likely first.
+    """
+    from langdetect import DetectorFactory, detect_langs
+    DetectorFactory.seed = 0
+    return lambda text: [(l.lang, l.prob) for l in detect_langs(text)]
+
+
+class LanguageResolver:
+    """
+    Picks the gTTS voice for a reply without running detection on every one.
+
+    Text shorter than `min_chars` is too short to detect reliably and gets the chat's
+    language: the last confident detection in that chat, else the Telegram client's
+    language_code given via hint(), else `default`. Longer text is detected once (results
+    are cached by text) and a confident result becomes the chat's language. Codes are
+    mapped to ones gTTS knows, falling back to the base language, then to `default`.
+    """
+
+    def __init__(self, default: str = "en", min_chars: int = 40, min_confidence: float = 0.8, cache_size: int = 4096, chats: int = 10000, detector=None):
+        self.default = default
+        self.min_chars = min_chars
+        self.min_confidence = min_confidence
+        self.detections = TTLCache(maxsize=cache_size)
+        self.chats = TTLCache(maxsize=chats)
+        self._detector = detector
+        self._supported = _gtts_languages()
+        self._lock = threading.Lock()
+
+    def warm(self) -> "LanguageResolver":
+        """Loads the detector's profiles now (this takes a while) rather than on the first reply."""
+        try:
+            self.detect("warm up the language profiles")
+        except Exception as e:
+            logger.warning(f"Language detector unavailable: {e}")
+        return self
+
+    def to_gtts(self, code: str | None) -> str | None:
+        """Maps a detected or Telegram language code to a gTTS one, or None if it has no voice."""
+        if not code:
+            return None
+        code = GTTS_ALIASES.get(code.lower(), code)
+        if not self._supported:
+            return code
+        for candidate in (code, code.split("-")[0]):
+            candidate = GTTS_ALIASES.get(candidate.lower(), candidate)
+            if candidate.lower() in self._supported:
+                return self._supported[candidate.lower()]
+        return None
+
+    def detect(self, text: str) -> tuple[str, float] | None:
+        """(code, probability) of the most likely language, cached by text."""
+        found = self.detections.get(text)
+        if found is None:
+            with self._lock:
+                if self._detector is None:
+                    self._detector = langdetect_detector()
+            candidates = self._detector(text)
+            found = candidates[0] if candidates else ("", 0.0)
+            self.detections.set(text, found)
+        return found if found[0] else None
+
+    def hint(self, chat_id, language_code: str | None):
+        """Seeds a chat's language from the user's client settings, unless one was already detected."""
+        lang = self.to_gtts(language_code)
+        if lang and chat_id not in self.chats:
+            self.chats.set(chat_id, lang)
+
+    def resolve(self, text: str, chat_id=None) -> str:
+        """The gTTS language to speak `text` in."""
+        text = (text or "").strip()
+        lang = None
+        if len(text) >= self.min_chars:
+            try:
+                found = self.detect(text)
+            except Exception:
+                found = None
+            lang = self.to_gtts(found[0]) if found else None
+            if lang and found[1] >= self.min_confidence:
+                if chat_id is not None:
+                    self.chats.set(chat_id, lang)
+                return lang
+        # Short or ambiguous: stay with the chat's language, a weak guess only if there is none
+        remembered = self.chats.get(chat_id) if chat_id is not None else None
+        return remembered or lang or self.default
+
+    def stats(self) -> dict:
+        return {"detections": self.detections.stats(), "chats": self.chats.stats()}
@@ -3,6 +3,8 @@ import asyncio
 from dotenv import load_dotenv
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
+from compaction import CompactingSessionService
+from tracing import Tracer, runner_kwargs
 from google.genai.types import Content, Part
 from instance.agent import root_agent
 
@@ -10,14 +12,17 @@ from instance.agent import root_agent
 load_dotenv()
 
 # Initialize in-memory session service
-session_service = InMemorySessionService()
+# Long chats keep only the newest events plus a running summary of the rest in the prompt
+session_service = CompactingSessionService.from_env(InMemorySessionService())
 
 # Create the runner with the agent
 APP_NAME = "agent"
+# Set TRACE_FILE=<path> to record each turn's model calls, tool calls and session I/O as OTLP/JSON spans
+tracer = Tracer.from_env("terminal")
 runner = Runner(
     agent=root_agent,
     app_name=APP_NAME,
-    session_service=session_service,
+    **runner_kwargs(tracer, session_service),
 )
 
 # Arbitrary user and session IDs for the terminal chat
@@ -54,17 +59,23 @@ async def chat_terminal():
         try:
             # Get response from the agent asynchronously
             response_text = ""
-            async for event in runner.run_async(
-                user_id=USER_ID,
-                session_id=SESSION_ID,
-                new_message=message
-            ):
-                if hasattr(event, "is_final_response") and event.is_final_response():
-                    if hasattr(event, "content") and event.content.parts:
-                        response_text = event.content.parts[0].text
-                    break
+            with tracer.span("terminal.turn", session_id=SESSION_ID):
+                async for event in runner.run_async(
+                    user_id=USER_ID,
+                    session_id=SESSION_ID,
+                    new_message=message
+                ):
+                    if hasattr(event, "is_final_response") and event.is_final_response():
+                        if hasattr(event, "content") and event.content.parts:
+                            response_text = event.content.parts[0].text
+                        break
             
             print(f"\nAgent: {response_text}")
+
+            # Fold older turns into the summary once the event window is full
+            if isinstance(session_service, CompactingSessionService):
+                session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+                await session_service.compact(session)
         except Exception as e:
             print(f"\nError: {str(e)}")
 
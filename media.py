@@ -0,0 +1,70 @@
+import tempfile
+
+import requests
+
+from caching import TTLCache
+from telegram_client import FileTooLarge, TelegramClient
+
+
+class MediaFetcher:
+    """
+    Fetches Telegram media (voice notes, photos, documents) by file_id.
+
+    getFile results are cached (file_id -> file_path) for somewhat less than the hour Telegram
+    guarantees download links to stay valid, so repeated media skips that round trip. Downloads
+    stream in chunks over the client's pooled session into a SpooledTemporaryFile: small files
+    stay in memory, large ones spill to disk, and anything above `max_bytes` is refused.
+    """
+
+    def __init__(self, telegram: TelegramClient, max_bytes: int = 20 * 1024 * 1024, spool_bytes: int = 1024 * 1024, path_ttl: float = 3000, cache_size: int = 4096):
+        self.telegram = telegram
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.paths = TTLCache(maxsize=cache_size, ttl=path_ttl)
+
+    def file_path(self, file_id: str, file_size: int | None = None) -> str | None:
+        """Resolves a file_id via getFile (cached). Returns None if Telegram refuses it."""
+        if file_size and file_size > self.max_bytes:
+            raise FileTooLarge(f"{file_id} is {file_size} bytes")
+        path = self.paths.get(file_id)
+        if path is None:
+            f = self.telegram.get_file(file_id)
+            if not f.get("ok"):
+                return None
+            size = f["result"].get("file_size") or 0
+            if size > self.max_bytes:
+                raise FileTooLarge(f"{file_id} is {size} bytes")
+            path = f["result"]["file_path"]
+            self.paths.set(file_id, path)
+        return path
+
+    def url(self, file_id: str, file_size: int | None = None) -> str | None:
+        """Download URL for a file_id, e.g. to hand to a service that fetches it itself."""
+        path = self.file_path(file_id, file_size)
+        return self.telegram.file_url(path) if path else None
+
+    def fetch(self, file_id: str, file_size: int | None = None):
+        """
+        Downloads a file into a SpooledTemporaryFile positioned at its start (the caller closes it).
+        Returns None if getFile fails; raises FileTooLarge above the size limit.
+        """
+        for attempt in range(2):
+            path = self.file_path(file_id, file_size)
+            if path is None:
+                return None
+            spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+            try:
+                self.telegram.download_to(path, spool, max_bytes=self.max_bytes)
+                return spool
+            except requests.HTTPError as e:
+                spool.close()
+                # A cached path may have expired: resolve the file_id again once
+                if attempt or e.response is None or e.response.status_code not in (400, 404):
+                    raise
+                self.paths.pop(file_id)
+            except BaseException:
+                spool.close()
+                raise
+
+    def stats(self) -> dict:
+        return {"file_paths": self.paths.stats()}
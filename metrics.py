@@ -0,0 +1,205 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast cache hits up to slow model turns and long voice notes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra: dict | None = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) per sample, for rendering."""
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    samples.append(("_bucket", key, {"le": _format_value(float(bound))}, cumulative))
+                samples.append(("_bucket", key, {"le": "+Inf"}, count))
+                samples.append(("_sum", key, None, total))
+                samples.append(("_count", key, None, count))
+        return samples
+
+
+class Registry:
+    """
+    A small Prometheus registry: counters, gauges and histograms with labels, rendered in the
+    text exposition format by render() (serve it at /metrics with CONTENT_TYPE).
+
+    collect(prefix, stats) also exposes an existing stats() dict (cache hit counts, queue
+    depths, ...) as gauges, read at scrape time: numeric leaves become `<prefix>_<path>`.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collect(self, prefix: str, stats):
+        """Registers a callable returning a (possibly nested) dict of numbers."""
+        self._collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._collectors:
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for name, value in _flatten(prefix, values):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix: str, value):
+    if isinstance(value, bool):
+        yield prefix, int(value)
+    elif isinstance(value, (int, float)):
+        yield prefix, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(f"{prefix}_{''.join(c if c.isalnum() else '_' for c in str(key))}", item)
+
+
+class Stages:
+    """
+    Latency, error and in-flight metrics for the stages of a request pipeline, all labelled
+    by stage: `<prefix>_stage_seconds` (histogram), `<prefix>_stage_errors_total` and
+    `<prefix>_stage_in_flight`. stage(name) works as a context manager or a decorator.
+    """
+
+    def __init__(self, registry: Registry, prefix: str, buckets=DEFAULT_BUCKETS):
+        self.seconds = registry.histogram(f"{prefix}_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets)
+        self.errors = registry.counter(f"{prefix}_stage_errors_total", "Pipeline stages that raised", ["stage"])
+        self.in_flight = registry.gauge(f"{prefix}_stage_in_flight", "Pipeline stages currently running", ["stage"])
+
+    @contextmanager
+    def stage(self, name: str):
+        self.in_flight.inc(stage=name)
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.errors.inc(stage=name)
+            raise
+        finally:
+            self.seconds.observe(time.perf_counter() - started, stage=name)
+            self.in_flight.dec(stage=name)
@@ -0,0 +1,102 @@
+import logging
+import sqlite3
+import threading
+
+from telegram_client import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+
+class OffsetStore:
+    """Persists the next getUpdates offset per bot in SQLite, so a restart resumes where it stopped."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS update_offsets (
+                bot_id TEXT PRIMARY KEY,
+                next_offset INTEGER NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def get(self, bot_id: str) -> int | None:
+        with self._lock:
+            row = self._db.execute("SELECT next_offset FROM update_offsets WHERE bot_id = ?", (bot_id,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, bot_id: str, offset: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO update_offsets (bot_id, next_offset) VALUES (?, ?) "
+                "ON CONFLICT(bot_id) DO UPDATE SET next_offset = excluded.next_offset",
+                (bot_id, offset),
+            )
+            self._db.commit()
+
+
+class UpdatePoller:
+    """
+    Receives updates with getUpdates long polling instead of a webhook (no public URL needed).
+
+    Each call waits up to `timeout` seconds on Telegram's side and returns up to `limit`
+    updates at once; every update is handed to `dispatch` (which should only queue it), then
+    the next offset is stored. Failures back off exponentially up to `max_backoff` seconds.
+    """
+
+    def __init__(self, telegram: TelegramClient, dispatch, offsets: OffsetStore, bot_id: str, timeout: int = 50, limit: int = 100, allowed_updates: list[str] | None = None, max_backoff: float = 30):
+        self.telegram = telegram
+        self.dispatch = dispatch
+        self.offsets = offsets
+        self.bot_id = bot_id
+        self.timeout = timeout
+        self.limit = limit
+        self.allowed_updates = allowed_updates or ["message"]
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self) -> int:
+        """Fetches and dispatches one batch; returns the number of updates."""
+        offset = self.offsets.get(self.bot_id)
+        r = self.telegram.get_updates(offset=offset, timeout=self.timeout, limit=self.limit, allowed_updates=self.allowed_updates)
+        if not r.get("ok"):
+            raise RuntimeError(r.get("description") or "getUpdates failed")
+        updates = r["result"]
+        for u in updates:
+            try:
+                self.dispatch(u)
+            except Exception:
+                logger.exception(f"Dispatching update {u.get('update_id')} failed")
+        if updates:
+            # Confirms the batch to Telegram on the next call and across restarts
+            self.offsets.set(self.bot_id, updates[-1]["update_id"] + 1)
+        return len(updates)
+
+    def run(self):
+        """Polls until stop() is called. Removes any webhook first, since Telegram allows only one of the two."""
+        r = self.telegram.delete_webhook()
+        if not r.get("ok"):
+            logger.warning(f"deleteWebhook failed: {r.get('description')}")
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(self.max_backoff, 2 ** failures)
+                logger.warning(f"getUpdates failed ({e}), retrying in {delay}s")
+                self._stop.wait(delay)
+
+    def start(self) -> "UpdatePoller":
+        self._thread = threading.Thread(target=self.run, name="update-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from caching import TTLCache
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to `capacity` tokens and refills `rate` tokens per second.
+    acquire() blocks until a token is available, so callers are smoothed to the rate with
+    bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Takes tokens if available and returns 0, otherwise returns the seconds to wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` would be available (0 if they are now), without taking them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self._tokens >= tokens else (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: float | None = None) -> bool:
+        """Blocks until tokens are taken; returns False if that would take longer than `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Empties the bucket for `seconds`, e.g. after the server answered 429 with retry_after."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class KeyedBuckets:
+    """One TokenBucket per key (e.g. chat id); idle buckets are dropped after `idle_ttl` seconds."""
+
+    def __init__(self, rate: float, capacity: float, maxsize: int = 10000, idle_ttl: float = 600):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = TTLCache(maxsize=maxsize, ttl=idle_ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+            # Re-store on every use so the idle timer restarts
+            self._buckets.set(key, bucket)
+            return bucket
+
+    def acquire(self, key, tokens: float = 1, timeout: float | None = None) -> bool:
+        return self.get(key).acquire(tokens, timeout)
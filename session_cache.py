@@ -0,0 +1,96 @@
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+from caching import TTLCache
+
+
+class CachedSessionService(BaseSessionService):
+    """
+    Keeps recently used, fully loaded sessions in memory in front of another session service.
+
+    A cache hit returns the same Session object the Runner appended to last turn, so active
+    chats skip the database load entirely. Writes still go straight to the wrapped service;
+    append_event only refreshes the cached entry afterwards. The cache is bounded by number
+    of sessions, by total cached events and by idle time.
+
+    This assumes one process owns the sessions it serves (as with index.py's history.db).
+    """
+
+    def __init__(self, inner: BaseSessionService, maxsize: int = 256, ttl: float | None = 1800, max_events: int | None = 20000):
+        self.inner = inner
+        self.cache = TTLCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            max_weight=max_events,
+            weigher=lambda session: len(session.events) + 1,
+        )
+
+    @staticmethod
+    def _key(app_name: str, user_id: str, session_id: str) -> tuple:
+        return app_name, user_id, session_id
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self.cache.set(self._key(app_name, user_id, session.id), session)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        # Filtered reads return partial event lists, so only full loads are cached
+        if config is not None:
+            return await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+        key = self._key(app_name, user_id, session_id)
+        session = self.cache.get(key)
+        if session is None:
+            session = await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            if session is not None:
+                self.cache.set(key, session)
+        return session
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.cache.pop(self._key(app_name, user_id, session_id))
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = self._key(session.app_name, session.user_id, session.id)
+        try:
+            event = await self.inner.append_event(session, event)
+        except Exception:
+            # e.g. a stale session: force the next turn to reload from storage
+            self.cache.pop(key)
+            raise
+        if not event.partial:
+            # Re-store to refresh recency and the event-count weight
+            self.cache.set(key, session)
+        return event
+
+    def invalidate(self, app_name: str, user_id: str, session_id: str):
+        """Drops one session from the cache so the next get_session reloads it."""
+        self.cache.pop(self._key(app_name, user_id, session_id))
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+    def __getattr__(self, name):
+        # Anything not overridden here (engine, helpers, ...) comes from the wrapped service
+        return getattr(self.inner, name)
@@ -0,0 +1,496 @@
+document.addEventListener('DOMContentLoaded', () => {
+    // The only per-request value, injected by the server into the page shell
+    const currentSessionId = document.body.dataset.sessionId;
+    const form = document.getElementById('chat-form');
+    const userInput = document.getElementById('user-input');
+    const chatWindow = document.getElementById('chat-window');
+    const sendButton = document.getElementById('send-button');
+    const sidebar = document.getElementById('sidebar');
+    const menuButton = document.getElementById('menu-button');
+    const sessionList = document.getElementById('session-list');
+    const loadMoreSessionsButton = document.getElementById('load-more-sessions');
+
+    // --- Sidebar Logic ---
+    const overlay = document.createElement('div');
+    overlay.className = 'fixed inset-0 bg-black opacity-0 transition-opacity duration-300 z-40 lg:hidden pointer-events-none';
+    document.body.appendChild(overlay);
+
+    let isSidebarOpen = false;
+
+    function toggleSidebar(open) {
+        // Only run on mobile (screen width < 1024px, the 'lg' breakpoint)
+        if (window.innerWidth >= 1024) return;
+        
+        isSidebarOpen = (open !== undefined) ? open : !isSidebarOpen;
+
+        if (isSidebarOpen) {
+            sidebar.classList.remove('-translate-x-full');
+            overlay.classList.remove('opacity-0', 'pointer-events-none');
+            overlay.classList.add('opacity-50', 'pointer-events-auto');
+        } else {
+            sidebar.classList.add('-translate-x-full');
+            overlay.classList.remove('opacity-50', 'pointer-events-auto');
+            overlay.classList.add('opacity-0', 'pointer-events-none');
+        }
+    }
+
+    menuButton.addEventListener('click', () => {
+        toggleSidebar();
+    });
+    
+    // Close sidebar when clicking the overlay
+    overlay.addEventListener('click', () => {
+        toggleSidebar(false);
+    });
+
+    // --- End Sidebar Logic ---
+
+    // Function to add a message to the chat window
+    function addMessage(text, role, prepend = false) {
+        const isUser = role === 'user';
+        const messageElement = document.createElement('div');
+        
+        if (isUser) {
+            messageElement.className = 'flex justify-end';
+            messageElement.innerHTML = `
+                <div class="bg-indigo-600 text-white p-4 rounded-xl rounded-br-sm max-w-[80%] shadow-lg break-words whitespace-pre-wrap">
+                    <!-- Placeholder will be filled with text content -->
+                </div>
+            `;
+        } else { // agent
+            messageElement.className = 'flex justify-start';
+            messageElement.innerHTML = `
+                <div class="bg-gray-200 text-gray-800 p-4 rounded-xl rounded-tl-sm max-w-[80%] shadow-lg break-words whitespace-pre-wrap">
+                    <!-- Placeholder will be filled with text content -->
+                </div>
+            `;
+        }
+        
+        // Sanitize text and handle HTML content
+        const contentDiv = messageElement.querySelector('div:last-child');
+        setMessageContent(contentDiv, text, role);
+        
+        if (prepend) {
+            // Older pages go above the current messages, below the "load earlier" button
+            chatWindow.insertBefore(messageElement, loadEarlierButton.nextSibling);
+        } else {
+            chatWindow.appendChild(messageElement);
+            // Scroll to the latest message
+            chatWindow.scrollTop = chatWindow.scrollHeight;
+        }
+        // Returned so streamed replies can keep updating the same bubble
+        return contentDiv;
+    }
+
+    function setMessageContent(contentDiv, text, role) {
+        if (role === 'agent' && text.includes('<b')) {
+            contentDiv.innerHTML = text; 
+        } else {
+            contentDiv.textContent = text;
+        }
+    }
+
+    // Splits one SSE frame (event and data lines) into its event name and JSON payload
+    function parseSseFrame(frame) {
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        return { event, data: data ? JSON.parse(data) : {} };
+    }
+
+    // Drops a message from the pending list, e.g. when the server never stored it
+    function dropPending(entry) {
+        const index = pendingMessages.indexOf(entry);
+        if (index !== -1) {
+            pendingMessages.splice(index, 1);
+        }
+    }
+
+    // Streams the agent reply from /chat/stream, rendering tokens as they arrive.
+    // Returns true once the server reports the reply as complete.
+    // `pendingUser` is dropped from the pending list if the request is rejected (nothing was saved).
+    async function streamAgentReply(message, pendingUser) {
+        const response = await fetch(`/chat/stream?session_id=${currentSessionId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ message: message })
+        });
+
+        // Validation errors are returned as plain JSON before any streaming starts
+        if (!response.ok || !response.body) {
+            dropPending(pendingUser);
+            const data = await response.json().catch(() => ({ response: response.statusText }));
+            hideLoading();
+            addMessage(`Error: ${data.response}`, 'agent');
+            console.error('Agent API Error:', data.response);
+            return false;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = '';
+        let bubble = null;
+        let completed = false;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const { event, data } = parseSseFrame(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event === 'token') {
+                    // First token replaces the loading indicator with a live bubble
+                    if (!bubble) {
+                        hideLoading();
+                        bubble = addMessage('', 'agent');
+                    }
+                    streamed += data.text;
+                    bubble.textContent = streamed;
+                    chatWindow.scrollTop = chatWindow.scrollHeight;
+                } else if (event === 'done') {
+                    hideLoading();
+                    if (bubble) {
+                        setMessageContent(bubble, data.response, 'agent');
+                    } else {
+                        addMessage(data.response, 'agent');
+                    }
+                    pendingMessages.push({ role: 'agent', text: data.response });
+                    completed = true;
+                } else if (event === 'error') {
+                    hideLoading();
+                    addMessage(`Error: ${data.response}`, 'agent');
+                    console.error('Agent API Error:', data.response);
+                }
+            }
+        }
+
+        hideLoading();
+        return completed;
+    }
+
+    // Cursors for the next (older) page of messages and sessions; null when exhausted
+    let historyCursor = null;
+    let sessionsCursor = null;
+
+    // Delta sync state: newest message id on screen, last /history ETag, and messages
+    // rendered locally (sent/streamed) that the server has not echoed back yet
+    let lastMessageId = 0;
+    let historyEtag = null;
+    const pendingMessages = [];
+
+    const loadEarlierButton = document.createElement('button');
+    loadEarlierButton.type = 'button';
+    loadEarlierButton.className = 'hidden w-full py-2 text-sm text-indigo-600 hover:underline';
+    loadEarlierButton.textContent = 'Load earlier messages';
+
+    // Function to populate the sidebar with session links
+    function populateSessionList(sessions, append = false) {
+        if (!append) {
+            sessionList.innerHTML = ''; // Clear existing list
+        }
+        sessions.forEach(sessionId => {
+            const link = document.createElement('a');
+            link.href = `/?session_id=${sessionId}`;
+            
+            link.className = `block p-2 text-sm rounded-lg hover:bg-gray-200 transition duration-150 truncate ${sessionId === currentSessionId ? 'bg-indigo-100 font-semibold text-indigo-700' : 'text-gray-700'}`;
+            
+            link.textContent = `Chat #${sessionId}`;
+            link.addEventListener('click', () => toggleSidebar(false)); // Close sidebar on session change
+            sessionList.appendChild(link);
+        });
+    }
+
+    function setSessionsCursor(cursor) {
+        sessionsCursor = cursor;
+        loadMoreSessionsButton.classList.toggle('hidden', cursor === null);
+    }
+
+    function setHistoryCursor(cursor) {
+        historyCursor = cursor;
+        loadEarlierButton.classList.toggle('hidden', cursor === null);
+    }
+    
+    // Function to load and display chat history and sessions
+    async function loadChatData() {
+        try {
+            const response = await fetch(`/history?session_id=${currentSessionId}`);
+            const data = await response.json();
+            
+            // 1. Clear chat window first
+            pendingMessages.length = 0;
+            chatWindow.innerHTML = '';
+            chatWindow.appendChild(loadEarlierButton);
+
+            // 2. Load History (latest page only; older pages load on demand)
+            const history = data.history || [];
+            if (history.length === 0) {
+                addMessage(`Welcome to Chat #<b class='text-indigo-700'>${currentSessionId}</b>! I am your ADK Agent, ready to assist you. Ask me anything!`, 'agent');
+            } else {
+                history.forEach(msg => {
+                    if (msg.role && msg.text) {
+                        addMessage(msg.text, msg.role);
+                    }
+                });
+            }
+            setHistoryCursor(data.history_cursor ?? null);
+            lastMessageId = history.reduce((max, msg) => Math.max(max, msg.id || 0), 0);
+            
+            // 3. Populate Session List
+            populateSessionList(data.sessions || []);
+            setSessionsCursor(data.sessions_cursor ?? null);
+
+        } catch (error) {
+            console.error('Failed to load chat data:', error);
+            // Fallback welcome message
+            chatWindow.innerHTML = '';
+            addMessage('Network or database error. Please refresh. If this is a new session, you can start chatting.', 'agent');
+        }
+    }
+
+    // Fetches only what changed since the last sync: new messages of this session are appended
+    // (or matched against locally rendered ones) and the session list is refreshed.
+    // An unchanged server state answers 304 with no body.
+    async function syncHistory() {
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const headers = historyEtag ? { 'If-None-Match': historyEtag } : {};
+                const response = await fetch(`/history?session_id=${currentSessionId}&since_id=${lastMessageId}`, {
+                    headers: headers,
+                    cache: 'no-store'
+                });
+                if (response.status === 304) return;
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+                const data = await response.json();
+                historyEtag = response.headers.get('ETag');
+                (data.history || []).forEach(appendSyncedMessage);
+                populateSessionList(data.sessions || []);
+                setSessionsCursor(data.sessions_cursor ?? null);
+                hasMore = Boolean(data.has_more);
+            }
+        } catch (error) {
+            console.error('Failed to sync chat data:', error);
+        }
+    }
+
+    function appendSyncedMessage(msg) {
+        lastMessageId = Math.max(lastMessageId, msg.id || 0);
+        const index = pendingMessages.findIndex(pending => pending.role === msg.role && pending.text === msg.text);
+        if (index !== -1) {
+            // Already on screen; the server copy confirms it, and anything queued before it
+            // was either confirmed or never stored, so it can't match a later message
+            pendingMessages.splice(0, index + 1);
+        } else if (msg.role && msg.text) {
+            addMessage(msg.text, msg.role);
+        }
+    }
+
+    // Prepends the previous page of messages, keeping the visible messages in place
+    loadEarlierButton.addEventListener('click', async () => {
+        if (historyCursor === null) return;
+        try {
+            const response = await fetch(`/history?session_id=${currentSessionId}&before=${historyCursor}`);
+            const data = await response.json();
+            const previousHeight = chatWindow.scrollHeight;
+            (data.history || []).slice().reverse().forEach(msg => {
+                if (msg.role && msg.text) {
+                    addMessage(msg.text, msg.role, true);
+                }
+            });
+            chatWindow.scrollTop += chatWindow.scrollHeight - previousHeight;
+            setHistoryCursor(data.history_cursor ?? null);
+        } catch (error) {
+            console.error('Failed to load earlier messages:', error);
+        }
+    });
+
+    // Appends the next page of sessions to the sidebar
+    loadMoreSessionsButton.addEventListener('click', async () => {
+        if (sessionsCursor === null) return;
+        try {
+            const response = await fetch(`/history?session_id=${currentSessionId}&sessions_before=${sessionsCursor}`);
+            const data = await response.json();
+            populateSessionList(data.sessions || [], true);
+            setSessionsCursor(data.sessions_cursor ?? null);
+        } catch (error) {
+            console.error('Failed to load more sessions:', error);
+        }
+    });
+
+    // --- Search ---
+    const searchInput = document.getElementById('search-input');
+    const searchPanel = document.getElementById('search-panel');
+    const sessionsPanel = document.getElementById('sessions-panel');
+    const searchResults = document.getElementById('search-results');
+    const loadMoreResultsButton = document.getElementById('load-more-results');
+    let searchOffset = null;
+    let searchTimer = null;
+    let searchRequest = 0; // Ignores responses to queries the user has already typed past
+    const MIN_SEARCH_CHARS = 2; // A single letter matches nearly every message and ranks slowly
+
+    // Builds a snippet node; the server marks matched terms with \u0002 ... \u0003 (never HTML)
+    function renderSnippet(snippet) {
+        const fragment = document.createDocumentFragment();
+        snippet.split('\u0002').forEach((chunk, index) => {
+            if (index === 0) {
+                fragment.appendChild(document.createTextNode(chunk));
+                return;
+            }
+            const [matched, rest = ''] = chunk.split('\u0003');
+            const mark = document.createElement('mark');
+            mark.className = 'bg-yellow-200';
+            mark.textContent = matched;
+            fragment.appendChild(mark);
+            fragment.appendChild(document.createTextNode(rest));
+        });
+        return fragment;
+    }
+
+    async function runSearch(query, append = false) {
+        const requestId = ++searchRequest;
+        const offset = append ? searchOffset : 0;
+        try {
+            const response = await fetch(`/search?q=${encodeURIComponent(query)}&offset=${offset}`);
+            const data = await response.json();
+            if (requestId !== searchRequest) return;
+
+            if (!append) searchResults.innerHTML = '';
+            (data.results || []).forEach(hit => {
+                const link = document.createElement('a');
+                link.href = `/?session_id=${encodeURIComponent(hit.session_id)}`;
+                link.className = 'block p-2 text-sm rounded-lg hover:bg-gray-200 transition duration-150 text-gray-700';
+
+                const meta = document.createElement('div');
+                meta.className = 'text-xs text-gray-500';
+                meta.textContent = `Chat #${hit.session_id} · ${hit.role}`;
+                const text = document.createElement('div');
+                text.className = 'break-words';
+                text.appendChild(renderSnippet(hit.snippet));
+
+                link.appendChild(meta);
+                link.appendChild(text);
+                link.addEventListener('click', () => toggleSidebar(false));
+                searchResults.appendChild(link);
+            });
+            if (!append && searchResults.childElementCount === 0) {
+                const empty = document.createElement('p');
+                empty.className = 'p-2 text-sm text-gray-500';
+                empty.textContent = 'No matching messages.';
+                searchResults.appendChild(empty);
+            }
+            searchOffset = data.next_offset ?? null;
+            loadMoreResultsButton.classList.toggle('hidden', searchOffset === null);
+        } catch (error) {
+            console.error('Search failed:', error);
+        }
+    }
+
+    // Debounced search-as-you-type from the second character on; a shorter query brings the session list back
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        const query = searchInput.value.trim();
+        const searching = query.length >= MIN_SEARCH_CHARS;
+        searchPanel.classList.toggle('hidden', !searching);
+        sessionsPanel.classList.toggle('hidden', searching);
+        if (!searching) {
+            searchRequest++;
+            return;
+        }
+        searchTimer = setTimeout(() => runSearch(query), 250);
+    });
+
+    loadMoreResultsButton.addEventListener('click', () => {
+        if (searchOffset !== null) runSearch(searchInput.value.trim(), true);
+    });
+
+    // Load chat data when the page loads
+    loadChatData();
+
+    // Catch up on messages sent from other tabs when this one becomes visible again (cheap: usually a 304)
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) {
+            syncHistory();
+        }
+    });
+
+    // Function to show a loading state
+    function showLoading() {
+        let loadingDiv = document.getElementById('loading-message');
+        if (!loadingDiv) {
+            loadingDiv = document.createElement('div');
+            loadingDiv.id = 'loading-message';
+            loadingDiv.className = 'flex justify-start';
+            loadingDiv.innerHTML = `
+                <div class="bg-gray-200 text-gray-600 p-4 rounded-xl rounded-tl-sm max-w-[80%] shadow-md">
+                    <span class="animate-pulse">Agent is thinking...</span>
+                </div>
+            `;
+            chatWindow.appendChild(loadingDiv);
+            chatWindow.scrollTop = chatWindow.scrollHeight;
+        }
+        return loadingDiv;
+    }
+
+    // Function to hide the loading state
+    function hideLoading() {
+        const loadingDiv = document.getElementById('loading-message');
+        if (loadingDiv) {
+            loadingDiv.remove();
+        }
+    }
+
+    // Handle form submission
+    form.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        
+        const message = userInput.value.trim();
+        if (!message) return;
+
+        // 1. Display user message
+        addMessage(message, 'user');
+        const pendingUser = { role: 'user', text: message };
+        pendingMessages.push(pendingUser);
+        
+        // 2. Clear input and disable input/button
+        userInput.value = '';
+        sendButton.disabled = true;
+        userInput.disabled = true;
+
+        // 3. Show loading indicator
+        showLoading();
+
+        try {
+            // 4. Stream the reply from the Flask backend, including session_id in the query
+            const completed = await streamAgentReply(message, pendingUser);
+
+            // 5. After a successful chat, pull only the new messages and the refreshed session list
+            if (completed) {
+                syncHistory();
+            }
+
+        } catch (error) {
+            dropPending(pendingUser);
+            // 5. Hide loading indicator on error
+            hideLoading();
+            // 6. Display network error
+            addMessage('Network Error: Could not reach the server.', 'agent');
+            console.error('Fetch Error:', error);
+        } finally {
+            // 7. Re-enable input/button
+            sendButton.disabled = false;
+            userInput.disabled = false;
+            userInput.focus();
+        }
+    });
+});
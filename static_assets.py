@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request
+
+# Brotli is optional: without it assets are served gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class StaticAssets:
+    """
+    Serves the files of a directory from memory under content-hashed names.
+
+    Every file is read, hashed and compressed (gzip, plus brotli when installed) once at
+    startup. A file named 'chat.js' is published as 'chat.<hash>.js'; because the name changes
+    whenever the content does, responses can be cached by browsers and proxies for a year.
+    """
+
+    MAX_AGE = 365 * 24 * 3600
+
+    def __init__(self, directory: str, url_prefix: str = "/assets/"):
+        self.url_prefix = url_prefix
+        self._hashed_names = {}  # 'chat.js' -> 'chat.<hash>.js'
+        self._files = {}  # 'chat.<hash>.js' -> (content_type, etag, {encoding: body})
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self._add(name, f.read())
+
+    def _add(self, name: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        hashed_name = f"{stem}.{digest}{ext}"
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "text/javascript"):
+            content_type += "; charset=utf-8"
+
+        bodies = {"identity": data, "gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(data, quality=11)
+        self._hashed_names[name] = hashed_name
+        self._files[hashed_name] = (content_type, digest, bodies)
+
+    def url(self, name: str) -> str:
+        """Returns the cache-busting URL for a file, e.g. asset_url('chat.css') in templates."""
+        return self.url_prefix + self._hashed_names[name]
+
+    def response(self, hashed_name: str) -> Response | None:
+        """Builds the response for a hashed file name, picking the best encoding the client accepts."""
+        entry = self._files.get(hashed_name)
+        if entry is None:
+            return None
+        content_type, etag, bodies = entry
+
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in bodies and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+
+        response = Response(bodies[encoding], content_type=content_type)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = f"public, max-age={self.MAX_AGE}, immutable"
+        response.set_etag(f"{etag}-{encoding}")
+        return response.make_conditional(request)
@@ -0,0 +1,192 @@
+import asyncio
+import io
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import KeyedBuckets, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented limits: about one message per second per chat (short bursts are tolerated)
+# and about 30 messages per second across all chats
+PER_CHAT_RATE, PER_CHAT_BURST = 1.0, 3
+GLOBAL_RATE, GLOBAL_BURST = 30.0, 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FileTooLarge(Exception):
+    """A download exceeded the caller's size limit."""
+
+
+class TelegramClient:
+    """
+    Bot API client on one pooled requests.Session (keep-alive, no TLS handshake per call).
+
+    Every call has connect/read timeouts and is retried with bounded exponential backoff on
+    connection errors, 5xx and 429; a 429's `retry_after` is honoured. send* methods first take
+    a token from the chat's bucket and from the global bucket, so bursts are smoothed to
+    Telegram's limits instead of being rejected.
+
+    Responses are returned as Telegram's JSON dict ({"ok": ..., "result"/"description": ...});
+    transport failures after the last retry come back as {"ok": False, "description": ...}.
+    The a* methods run the same calls in a worker thread for async callers.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str = "https://api.telegram.org",
+        timeout: tuple[float, float] = (5, 30),
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        pool_size: int = 32,
+    ):
+        self.api_url = f"{base_url}/bot{token}"
+        self.file_base_url = f"{base_url}/file/bot{token}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.chat_limits = KeyedBuckets(PER_CHAT_RATE, PER_CHAT_BURST)
+        self.global_limit = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+
+    def _sleep_before_retry(self, attempt: int, retry_after: float | None = None):
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        time.sleep(delay)
+
+    def request(self, method: str, data: dict | None = None, json: dict | None = None, files: dict | None = None, timeout=None) -> dict:
+        """Calls a Bot API method, applying send limits and retries; returns the decoded response."""
+        chat_id = (json or data or {}).get("chat_id")
+        if method.startswith("send") and chat_id is not None:
+            self.chat_limits.acquire(str(chat_id))
+            self.global_limit.acquire()
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            if files:
+                # Rewind uploads so a retry sends the whole file again
+                for value in files.values():
+                    fp = value[1] if isinstance(value, tuple) else value
+                    if hasattr(fp, "seek"):
+                        fp.seek(0)
+            try:
+                r = self.session.post(f"{self.api_url}/{method}", data=data, json=json, files=files, timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    return {"ok": False, "description": f"{method} failed: {e}"}
+                logger.warning(f"Telegram {method} attempt {attempt + 1} failed: {e}")
+                self._sleep_before_retry(attempt)
+                continue
+
+            try:
+                body = r.json()
+            except ValueError:
+                body = {"ok": False, "error_code": r.status_code, "description": r.text[:200]}
+            if r.status_code not in RETRY_STATUSES or last:
+                return body
+
+            retry_after = (body.get("parameters") or {}).get("retry_after") if r.status_code == 429 else None
+            if retry_after and chat_id is not None:
+                # Hold back the rest of this chat's sends too, not just this one
+                self.chat_limits.get(str(chat_id)).pause(retry_after)
+            logger.warning(f"Telegram {method} returned {r.status_code}, retrying (attempt {attempt + 1})")
+            self._sleep_before_retry(attempt, retry_after)
+
+    # -------- Bot API methods --------
+    def send_message(self, chat_id, text: str, **params) -> dict:
+        return self.request("sendMessage", json={"chat_id": chat_id, "text": text, **params})
+
+    def send_voice(self, chat_id, audio_fp, filename: str = "reply.ogg", **params) -> dict:
+        return self.request("sendVoice", data={"chat_id": chat_id, **params}, files={"voice": (filename, audio_fp, "audio/ogg")})
+
+    def get_file(self, file_id: str) -> dict:
+        return self.request("getFile", json={"file_id": file_id})
+
+    def set_webhook(self, url: str, secret_token: str | None = None, **params) -> dict:
+        payload = {"url": url, **params}
+        if secret_token:
+            payload["secret_token"] = secret_token
+        return self.request("setWebhook", json=payload)
+
+    def get_updates(self, offset: int | None = None, timeout: int = 50, limit: int = 100, allowed_updates: list[str] | None = None) -> dict:
+        """Long-polls for updates; the read timeout covers the `timeout` seconds Telegram may hold the call."""
+        payload = {"timeout": timeout, "limit": limit}
+        if offset is not None:
+            payload["offset"] = offset
+        if allowed_updates is not None:
+            payload["allowed_updates"] = allowed_updates
+        return self.request("getUpdates", json=payload, timeout=(self.timeout[0], timeout + 10))
+
+    def delete_webhook(self, drop_pending_updates: bool = False) -> dict:
+        return self.request("deleteWebhook", json={"drop_pending_updates": drop_pending_updates})
+
+    # -------- Files --------
+    def file_url(self, file_path: str) -> str:
+        return f"{self.file_base_url}/{file_path}"
+
+    def download(self, file_path: str) -> bytes:
+        """Downloads a file returned by getFile into memory."""
+        buf = io.BytesIO()
+        self.download_to(file_path, buf)
+        return buf.getvalue()
+
+    def download_to(self, file_path: str, fp, max_bytes: int | None = None, chunk_size: int = 64 * 1024) -> int:
+        """
+        Streams a file returned by getFile into `fp` in chunks over the pooled session and returns
+        its size. Raises FileTooLarge once more than `max_bytes` arrive (or are announced), and
+        retries transient failures like request().
+        """
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                with self.session.get(self.file_url(file_path), stream=True, timeout=self.timeout) as r:
+                    if r.status_code in RETRY_STATUSES and not last:
+                        self._sleep_before_retry(attempt)
+                        continue
+                    r.raise_for_status()
+                    if max_bytes is not None and int(r.headers.get("Content-Length") or 0) > max_bytes:
+                        raise FileTooLarge(f"{file_path} is larger than {max_bytes} bytes")
+                    fp.seek(0)
+                    fp.truncate()
+                    size = 0
+                    for chunk in r.iter_content(chunk_size):
+                        size += len(chunk)
+                        if max_bytes is not None and size > max_bytes:
+                            raise FileTooLarge(f"{file_path} is larger than {max_bytes} bytes")
+                        fp.write(chunk)
+                    fp.seek(0)
+                    return size
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if last:
+                    raise
+                logger.warning(f"Telegram download attempt {attempt + 1} failed: {e}")
+                self._sleep_before_retry(attempt)
+
+    # -------- Async wrappers --------
+    async def arequest(self, method: str, **kwargs) -> dict:
+        return await asyncio.to_thread(self.request, method, **kwargs)
+
+    async def asend_message(self, chat_id, text: str, **params) -> dict:
+        return await asyncio.to_thread(self.send_message, chat_id, text, **params)
+
+    async def asend_voice(self, chat_id, audio_fp, **params) -> dict:
+        return await asyncio.to_thread(self.send_voice, chat_id, audio_fp, **params)
+
+    async def adownload(self, file_path: str) -> bytes:
+        return await asyncio.to_thread(self.download, file_path)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+
+class ThreadedSessionService(BaseSessionService):
+    """
+    Runs a session service whose async methods block on worker threads.
+
+    ADK's DatabaseSessionService is async in name only: every call runs synchronous
+    SQLAlchemy queries. Awaited directly on a shared event loop, one slow load or one write
+    waiting on SQLite's lock would stall every other chat on that loop. Here each call is
+    driven to completion on a worker thread (each with a private event loop), so the shared
+    loop only waits for the result and keeps serving model I/O meanwhile.
+
+    Loads run in parallel. Writes (create, append, delete) still run one at a time, as they
+    did on the loop: ADK updates the shared app and user state rows read-modify-write, and the
+    first sessions of a new app would otherwise race to insert its row.
+    """
+
+    def __init__(self, inner: BaseSessionService, workers: int = 4, name: str = "session-io"):
+        self.inner = inner
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _drive(self, coro):
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(coro)
+
+    def _drive_write(self, coro):
+        with self._write_lock:
+            return self._drive(coro)
+
+    async def _call(self, coro, write: bool = False):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._drive_write if write else self._drive, coro)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        return await self._call(self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id), write=True)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        return await self._call(self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config))
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self._call(self.inner.list_sessions(app_name=app_name, user_id=user_id))
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self._call(self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id), write=True)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        return await self._call(self.inner.append_event(session, event), write=True)
+
+    def __getattr__(self, name):
+        # engine, ... come from the wrapped service
+        return getattr(self.inner, name)
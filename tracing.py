@@ -0,0 +1,418 @@
+import asyncio
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_CLIENT = 1, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+class Span:
+    """One timed operation. Ended spans are handed to the tracer's exporter."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "status", "message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, kind: int = KIND_INTERNAL, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        self.status = STATUS_OK
+        self.message = ""
+
+    def set(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status, **({"message": self.message} if self.message else {})},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class FileSpanExporter:
+    """
+    Appends finished spans to a file as OTLP/JSON, one ExportTraceServiceRequest per line
+    (the format the OpenTelemetry Collector's file exporter writes and its otlpjsonfile
+    receiver reads). Spans are queued and written in batches from a background thread, so
+    recording a span never waits on the disk.
+    """
+
+    def __init__(self, path: str, service_name: str, flush_interval: float = 1.0, max_batch: int = 512):
+        self.path = path
+        self.resource = {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]}
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def close(self):
+        """Writes out queued spans and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._stop)
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1] is not self._stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not self._stop]
+            stopping = len(spans) != len(batch)
+            if not spans:
+                continue
+            request = {"resourceSpans": [{
+                "resource": self.resource,
+                "scopeSpans": [{"scope": {"name": "adk-web"}, "spans": [span.to_otlp() for span in spans]}],
+            }]}
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(request, separators=(",", ":")) + "\n")
+            except OSError as e:
+                logger.error(f"Writing {len(spans)} spans to {self.path} failed: {e}")
+
+
+class Tracer:
+    """
+    Creates spans and sends the finished ones to an exporter; without an exporter every call
+    is a cheap no-op, so call sites need no checks.
+
+    span() is a context manager that makes the new span the current one (a contextvar, so it
+    follows asyncio tasks); start()/end() are for spans that open and close in different
+    callbacks, which keep them findable under a key with remember()/recall()/forget().
+    """
+
+    def __init__(self, exporter: FileSpanExporter | None = None):
+        self.exporter = exporter
+        self._current = contextvars.ContextVar("current_span", default=None)
+        self._open = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, service_name: str) -> "Tracer":
+        """TRACE_FILE=<path> turns tracing on, writing OTLP/JSON lines to that file."""
+        path = os.getenv("TRACE_FILE")
+        return cls(FileSpanExporter(path, service_name) if path else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def current(self) -> Span | None:
+        return self._current.get()
+
+    def start(self, name: str, parent: Span | None = None, kind: int = KIND_INTERNAL, **attributes) -> Span | None:
+        """Opens a span under `parent`, or under the current span if none is given."""
+        if not self.enabled:
+            return None
+        parent = parent or self.current()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        return Span(name, trace_id, parent.span_id if parent else None, kind, attributes)
+
+    def end(self, span: Span | None, error: BaseException | str | None = None):
+        if span is None or span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.status = STATUS_ERROR
+            span.message = str(error)[:500]
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, parent: Span | None = None, kind: int = KIND_INTERNAL, **attributes):
+        span = self.start(name, parent, kind, **attributes)
+        if span is None:
+            yield None
+            return
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, e)
+            raise
+        finally:
+            self._current.reset(token)
+            self.end(span)
+
+    def remember(self, key, span: Span | None):
+        if span is not None:
+            with self._lock:
+                self._open[key] = span
+
+    def recall(self, key) -> Span | None:
+        with self._lock:
+            return self._open.get(key)
+
+    def forget(self, key) -> Span | None:
+        with self._lock:
+            return self._open.pop(key, None)
+
+    def forget_where(self, match) -> list[Span]:
+        """Removes and returns every remembered span whose key satisfies `match(key)`."""
+        with self._lock:
+            keys = [key for key in self._open if match(key)]
+            return [self._open.pop(key) for key in keys]
+
+
+class TracingPlugin(BasePlugin):
+    """
+    ADK plugin that records each Runner invocation as a span tree:
+
+        invocation (one user turn)
+          agent <name>
+            model <model>          one per LLM request, with token usage
+            tool <name>            one per function call, e.g. get_weather
+
+    The invocation span is parented to whatever span is current when the run starts (e.g.
+    the app's turn span). Callbacks only observe; they never change requests or results.
+    A run that stops before its final response (cancelled, e.g. by a client disconnecting,
+    or failed) has its open spans ended with an error when the task running it finishes.
+    """
+
+    def __init__(self, tracer: Tracer, name: str = "tracing"):
+        super().__init__(name)
+        self.tracer = tracer
+        self._watches = {}  # invocation id -> (task running it, its done callback)
+
+    def _parent(self, invocation_id: str, agent_name: str | None = None) -> Span | None:
+        return self.tracer.recall(("agent", invocation_id, agent_name)) or self.tracer.recall(("invocation", invocation_id))
+
+    async def before_run_callback(self, *, invocation_context):
+        span = self.tracer.start(
+            "invocation",
+            app=invocation_context.session.app_name,
+            session_id=invocation_context.session.id,
+            user_id=invocation_context.session.user_id,
+            invocation_id=invocation_context.invocation_id,
+            root_agent=invocation_context.agent.name,
+        )
+        if span is not None:
+            span.set("events", 0)
+        self.tracer.remember(("invocation", invocation_context.invocation_id), span)
+        task = asyncio.current_task()
+        if span is not None and task is not None:
+            # Neither the final response nor after_run comes if the run is cancelled or raises
+            invocation_id = invocation_context.invocation_id
+            callback = lambda task: self._finish(invocation_id, _task_error(task))
+            self._watches[invocation_id] = (task, callback)
+            task.add_done_callback(callback)
+        return None
+
+    def _finish(self, invocation_id: str, error: BaseException | str | None = None):
+        """Ends the invocation span and anything still open under it, children first."""
+        watch = self._watches.pop(invocation_id, None)
+        if watch is not None:
+            watch[0].remove_done_callback(watch[1])
+        spans = self.tracer.forget_where(lambda key: key[1] == invocation_id)
+        for span in sorted(spans, key=lambda span: span.name == "invocation"):
+            self.tracer.end(span, error)
+
+    async def on_event_callback(self, *, invocation_context, event):
+        span = self.tracer.recall(("invocation", invocation_context.invocation_id))
+        if span is not None and not event.partial:
+            span.attributes["events"] += 1
+            if event.is_final_response():
+                # Callers usually stop iterating at the final response, so after_run may never come
+                self._finish(invocation_context.invocation_id)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        self._finish(invocation_context.invocation_id)
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        invocation_id = callback_context.invocation_id
+        span = self.tracer.start(f"agent {agent.name}", self._parent(invocation_id), agent=agent.name)
+        self.tracer.remember(("agent", invocation_id, agent.name), span)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        self.tracer.end(self.tracer.forget(("agent", callback_context.invocation_id, agent.name)))
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        invocation_id, agent_name = callback_context.invocation_id, callback_context.agent_name
+        span = self.tracer.start(
+            f"model {llm_request.model}",
+            self._parent(invocation_id, agent_name),
+            KIND_CLIENT,
+            model=llm_request.model,
+            agent=agent_name,
+            request_contents=len(llm_request.contents or []),
+        )
+        self.tracer.remember(("model", invocation_id, agent_name), span)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        key = ("model", callback_context.invocation_id, callback_context.agent_name)
+        if llm_response.partial:
+            # Streaming: note when the first chunk arrived and keep the span open for the rest
+            span = self.tracer.recall(key)
+            if span is not None and "first_chunk_ms" not in span.attributes:
+                span.set("first_chunk_ms", round((time.time_ns() - span.start_ns) / 1e6, 1))
+            return None
+        span = self.tracer.forget(key)
+        if span is not None:
+            usage = llm_response.usage_metadata
+            if usage is not None:
+                span.set("input_tokens", usage.prompt_token_count)
+                span.set("output_tokens", usage.candidates_token_count)
+            if llm_response.finish_reason is not None:
+                span.set("finish_reason", str(llm_response.finish_reason))
+            if llm_response.grounding_metadata is not None:
+                span.set("grounded", True)  # built-in tools such as google_search run inside the model call
+        self.tracer.end(span, llm_response.error_message)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self.tracer.end(self.tracer.forget(("model", callback_context.invocation_id, callback_context.agent_name)), error)
+        return None
+
+    def _tool_key(self, tool, tool_context) -> tuple:
+        return ("tool", tool_context.invocation_id, getattr(tool_context, "function_call_id", None) or tool.name)
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        span = self.tracer.start(
+            f"tool {tool.name}",
+            self._parent(tool_context.invocation_id, tool_context.agent_name),
+            tool=tool.name,
+            agent=tool_context.agent_name,
+            args=json.dumps(tool_args, default=str)[:1000],
+        )
+        self.tracer.remember(self._tool_key(tool, tool_context), span)
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        span = self.tracer.forget(self._tool_key(tool, tool_context))
+        # Tools in this repo report failures as {"status": "error", "error_message": ...}
+        error = None
+        if isinstance(result, dict) and result.get("status") == "error":
+            error = result.get("error_message") or result.get("error") or "error"
+        self.tracer.end(span, error)
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self.tracer.end(self.tracer.forget(self._tool_key(tool, tool_context)), error)
+        return None
+
+
+def _task_error(task: asyncio.Task) -> BaseException | str:
+    if task.cancelled():
+        return "cancelled"
+    return task.exception() or "run ended before its final response"
+
+
+class TracingSessionService(BaseSessionService):
+    """
+    Wraps a session service with spans for session I/O: loads, creates and event appends.
+    Appends are parented to their invocation's span (via event.invocation_id), loads to the
+    current span, so both show up on the turn's critical path.
+    """
+
+    def __init__(self, inner: BaseSessionService, tracer: Tracer):
+        self.inner = inner
+        self.tracer = tracer
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        with self.tracer.span("session.create", session_id=session_id):
+            return await self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        with self.tracer.span("session.load", session_id=session_id) as span:
+            session = await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+            if span is not None:
+                span.set("found", session is not None)
+                span.set("events", len(session.events) if session else 0)
+            return session
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            # Streamed chunks are not persisted; a span each would only be noise
+            return await self.inner.append_event(session, event)
+        parent = self.tracer.recall(("invocation", event.invocation_id))
+        with self.tracer.span("session.append_event", parent, session_id=session.id, author=event.author):
+            return await self.inner.append_event(session, event)
+
+    def __getattr__(self, name):
+        # stats(), compact(), engine, ... come from the wrapped service
+        return getattr(self.inner, name)
+
+
+def runner_kwargs(tracer: Tracer, session_service: BaseSessionService) -> dict:
+    """Runner(session_service=..., plugins=...) arguments with tracing wired in (plain ones when it is off)."""
+    if not tracer.enabled:
+        return {"session_service": session_service}
+    return {"session_service": TracingSessionService(session_service, tracer), "plugins": [TracingPlugin(tracer)]}
@@ -0,0 +1,157 @@
+import io
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends: Latin/Devanagari/CJK terminators followed by whitespace (or end of CJK punctuation)
+SENTENCE_END = re.compile(r"(?<=[.!?।…])\s+|(?<=[。！？])")
+CJK_END = "。！？"
+
+
+def _join(a: str, b: str) -> str:
+    return f"{a}{b}" if a.endswith(tuple(CJK_END)) else f"{a} {b}"
+
+
+def split_sentences(text: str, min_chars: int = 40, max_chars: int = 200) -> list[str]:
+    """
+    Splits text into sentence chunks for separate synthesis. Short sentences are merged up to
+    `min_chars` so each chunk is worth a request; sentences longer than `max_chars` are cut at
+    word boundaries (or hard, for text without spaces).
+    """
+    chunks = []
+    current = ""
+    for sentence in (s.strip() for s in SENTENCE_END.split(text or "")):
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        current = _join(current, sentence) if current else sentence
+        if len(current) >= min_chars:
+            chunks.append(current)
+            current = ""
+    if current:
+        if chunks and len(chunks[-1]) + len(current) < max_chars:
+            chunks[-1] = _join(chunks[-1], current)
+        else:
+            chunks.append(current)
+    return chunks
+
+
+def synthesize_chunk(text: str, lang: str, codec: str = "libopus") -> bytes:
+    """gTTS → MP3 → OGG/Opus for one chunk. Runs in a pool process (module level so it pickles)."""
+    from gtts import gTTS
+    from pydub import AudioSegment
+
+    mp3 = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(mp3)
+    mp3.seek(0)
+    ogg = io.BytesIO()
+    AudioSegment.from_file(mp3, format="mp3").export(ogg, format="ogg", codec=codec)
+    return ogg.getvalue()
+
+
+def concat_ogg(chunks: list[bytes], ffmpeg: str = "ffmpeg") -> bytes:
+    """Joins OGG/Opus files with ffmpeg's concat demuxer, copying packets instead of re-encoding."""
+    if len(chunks) == 1:
+        return chunks[0]
+    with tempfile.TemporaryDirectory(prefix="tts-") as tmp:
+        listing = []
+        for i, data in enumerate(chunks):
+            path = os.path.join(tmp, f"{i:04d}.ogg")
+            with open(path, "wb") as f:
+                f.write(data)
+            listing.append(f"file '{path}'")
+        list_path = os.path.join(tmp, "list.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(listing) + "\n")
+        out_path = os.path.join(tmp, "out.ogg")
+        subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", out_path],
+            check=True,
+            capture_output=True,
+        )
+        with open(out_path, "rb") as f:
+            return f.read()
+
+
+class TTSPipeline:
+    """
+    Synthesizes replies sentence by sentence in a process pool and joins the Opus output.
+
+    Chunks are fetched and encoded in parallel across `workers` processes, so long replies are
+    ready sooner and encoding uses every core instead of the calling thread. On POSIX the pool
+    forks; call start() early (before the app starts threads) so the workers fork from a clean,
+    single-threaded process. The pool is never re-forked later: without it (not started, or
+    broken because a worker died) replies are synthesized inline on the calling thread.
+    """
+
+    def __init__(self, workers: int | None = None, codec: str = "libopus", min_chars: int = 40, max_chars: int = 200):
+        self.workers = workers or os.cpu_count() or 2
+        self.codec = codec
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Creates the pool and launches its worker processes."""
+        methods = multiprocessing.get_all_start_methods()
+        # fork avoids re-importing the app's main module in every worker
+        context = multiprocessing.get_context("fork") if "fork" in methods else None
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        pool.submit(int).result()
+        with self._lock:
+            self._pool = pool
+        return self
+
+    def synthesize(self, text: str, lang: str, cancelled=None) -> bytes | None:
+        """
+        Returns the reply as one OGG/Opus file. If `cancelled()` turns true while chunks are
+        being synthesized, the remaining chunks are dropped and None is returned.
+        """
+        chunks = split_sentences(text, self.min_chars, self.max_chars)
+        if not chunks:
+            raise ValueError("nothing to synthesize")
+        pool = self._pool
+        if pool is None:
+            return concat_ogg([synthesize_chunk(chunk, lang, self.codec) for chunk in chunks])
+        try:
+            futures = [pool.submit(synthesize_chunk, chunk, lang, self.codec) for chunk in chunks]
+            parts = []
+            for future in futures:
+                if cancelled and cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                parts.append(future.result())
+            return concat_ogg(parts)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM). Forking a new pool from this threaded process is unsafe,
+            # so this and later replies are synthesized inline
+            with self._lock:
+                # Another caller may already have dropped it
+                if self._pool is pool:
+                    self._pool = None
+                    logger.warning("TTS process pool broke, synthesizing inline from now on")
+            pool.shutdown(wait=False, cancel_futures=True)
+            return concat_ogg([synthesize_chunk(chunk, lang, self.codec) for chunk in chunks])
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
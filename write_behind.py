@@ -0,0 +1,70 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Queues rows for a single INSERT statement and group-commits them from a background thread.
+
+    Callers return immediately; the writer collects rows for up to `flush_interval` seconds
+    (or `max_batch` rows) and writes each batch with one executemany() and one commit, so many
+    concurrent inserts cost a single fsync and a single write lock acquisition.
+    """
+
+    def __init__(self, connect, sql: str, flush_interval: float = 0.05, max_batch: int = 500):
+        self._connect = connect
+        self._sql = sql
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, row: tuple):
+        """Queues one row of parameters for the INSERT statement."""
+        self._queue.put(row)
+
+    def flush(self):
+        """Blocks until every row queued so far has been committed."""
+        self._queue.join()
+
+    def close(self):
+        """Writes out pending rows and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._stop)
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        db = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [row for row in batch if row is not self._stop]
+            stopping = len(rows) != len(batch)
+            try:
+                if rows:
+                    with db:
+                        db.executemany(self._sql, rows)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(rows)} rows failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        db.close()